@@ -18,7 +18,15 @@
 #define SOFA_ADDR IPAddress(192,168,  3,  1)
 #define SOFA_PORT 31337
 
+// binary joystick packets, see sofa/remote_packet.py
+#define PACKET_MAGIC 0xA5
+#define PACKET_VERSION 1
+#define PACKET_SIZE 20
+#define PACKET_FLAG_Z 0x01
+#define PACKET_FLAG_C 0x02
+
 unsigned long last_update = 0;
+unsigned long packet_seq = 0;
 
 WiFiUDP udp;
 
@@ -89,14 +97,35 @@ bool process_status_packet() {
   }
 }
 
+void put_uint32(uint8_t *buf, uint32_t value) {
+  // little endian, whatever the host byte order
+  buf[0] = value & 0xff;
+  buf[1] = (value >> 8) & 0xff;
+  buf[2] = (value >> 16) & 0xff;
+  buf[3] = (value >> 24) & 0xff;
+}
+
 void send_packet(int status_age, unsigned int duty_cycle) {
-  char packet[100];
+  uint8_t packet[PACKET_SIZE];
   nunchuk.update();
   if (validate_nunchuk(nunchuk)) {
-    sprintf(packet, "%03d:%03d:%1d:%1d:%d:%d:%d", nunchuk.analogX, nunchuk.analogY, 
-            nunchuk.zButton, nunchuk.cButton, status_age, duty_cycle, duty_cycle);
+    if (duty_cycle > 255) {
+      duty_cycle = 255;
+    }
+    packet[0] = PACKET_MAGIC;
+    packet[1] = PACKET_VERSION;
+    packet[2] = (nunchuk.zButton ? PACKET_FLAG_Z : 0) |
+                (nunchuk.cButton ? PACKET_FLAG_C : 0);
+    packet[3] = nunchuk.analogX;
+    packet[4] = nunchuk.analogY;
+    packet[5] = duty_cycle;
+    packet[6] = duty_cycle;
+    packet[7] = 0;
+    put_uint32(packet + 8, packet_seq++);
+    put_uint32(packet + 12, millis());
+    put_uint32(packet + 16, (uint32_t)status_age);
     udp.beginPacket(SOFA_ADDR, SOFA_PORT);
-    udp.write(packet);
+    udp.write(packet, PACKET_SIZE);
     udp.endPacket();
   }
 }
@@ -0,0 +1,350 @@
+#!/usr/bin/python
+"""
+microbenchmarks for the per-packet hot path, compared against a stored
+baseline.  everything runs offline, with no serial device and no socket,
+on a frozen virtual clock so joysticks never age out mid-run.
+
+the baseline is only meaningful on the machine it was saved on: save one
+on the board you're tuning (--save), then rerun after each change.  each
+benchmark is timed alongside a fixed reference workload, and compared
+relative to it, so a board that's running hot (or a noisy vm) doesn't
+read as a regression.
+"""
+import json
+import os
+import sys
+import timeit
+from optparse import OptionParser
+
+import accel_limit
+import clock
+import loop_timing
+import motion_complex
+import nunchuk_joystick
+import packet_history
+import receiver
+import remote
+import remote_packet
+import remote_session
+import roboteq
+import sofa
+from motion_crawl import CrawlMC
+from motion_normal import ForwardMC, ReverseMC
+from motion_spin import SpinMC
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'benchmark_baseline.json')
+
+# a benchmark more than this much slower than its baseline is a regression
+DEFAULT_THRESHOLD = 0.20
+# noisier benchmarks get more slack
+THRESHOLDS = {
+    'Status._render': 0.30,
+    'Status.as_dict': 0.30,
+}
+# ...and so does anything this quick: a slowdown has to be at least this
+# many microseconds, so sub-microsecond calls can't fail on timer noise
+NOISE_FLOOR = 0.5
+# a regression has to show up again in this many reruns to count, with the
+# best of all the runs compared against the baseline
+RECHECKS = 2
+
+BENCHMARKS = []
+
+
+def benchmark(func):
+    """register a benchmark, which sets up and returns the callable to time"""
+    BENCHMARKS.append((func.__name__.replace('__', '.'), func))
+    return func
+
+
+def _joystick(raw_x=135, raw_y=231, button_z=False, button_c=False):
+    return nunchuk_joystick.from_remote_nunchuk(raw_x, raw_y, button_z,
+                                                button_c, clock.monotonic())
+
+
+@benchmark
+def from_remote_nunchuk():
+    # the table is built on first use, time it once it's there
+    nunchuk_joystick.table_for(nunchuk_joystick.OEM)
+    return lambda: nunchuk_joystick.from_remote_nunchuk(200, 200, False,
+                                                        False, 0)
+
+
+@benchmark
+def nunchuk_joystick___raw_vector():
+    # the math that the lookup table replaces
+    return lambda: nunchuk_joystick._raw_vector(200, 200)
+
+
+@benchmark
+def remote_packet__decode():
+    packet = bytearray(remote_packet.encode(remote_packet.RemotePacket(
+        200, 200, False, False, 10, 3, 4, 1, 5)))
+    return lambda: remote_packet.decode(packet, len(packet))
+
+
+@benchmark
+def RemoteSession__update():
+    # the parse that RemoteControlReceiver.receive does for each remote
+    session = remote_session.RemoteSession(
+        ('127.0.0.1', 1), None, receiver.RemoteControlReceiver.INTERVAL,
+        packet_history.PacketHistory.WINDOW,
+        receiver.RemoteControlReceiver.MAX_PACKET)
+    packet = remote_packet.encode(remote_packet.RemotePacket(
+        200, 200, False, False, 10, 3, 4, 1, 5))
+
+    def update():
+        session.latest[:len(packet)] = packet
+        session.size = len(packet)
+        session.arrival = clock.monotonic()
+        session.received = 1
+        session.update(clock.monotonic(), 0.005)
+    return update
+
+
+def _filled_history():
+    history = packet_history.PacketHistory(
+        receiver.RemoteControlReceiver.INTERVAL)
+    for i in range(history.WINDOW * 2):
+        history.add(i * 0.1, 0.005, 1)
+    return history
+
+
+@benchmark
+def PacketHistory__add():
+    history = _filled_history()
+    now = [1000.0]
+
+    def add():
+        now[0] += 0.1
+        history.add(now[0], 0.005, 1)
+    return add
+
+
+@benchmark
+def PacketHistory__summary():
+    history = _filled_history()
+    return lambda: history.summary
+
+
+def _sofa_status():
+    history = _filled_history()
+    percentiles = receiver.link_percentiles_status(history.percentiles)
+
+    (avg_duty_cycle, max_duty_cycle, interval, jitter, packet_loss,
+     reordered, duplicates, loss_burst) = history.summary
+    remote_control = remote.RemoteControl(None, None)
+    remote_control.set_status(remote.RemoteControlStatus(
+        joystick=_joystick(), updated_monotonic=clock.monotonic(),
+        avg_duty_cycle=3, max_duty_cycle=4))
+    receiver_status = receiver.ReceiverStatus(
+        avg_duty_cycle=avg_duty_cycle, max_duty_cycle=max_duty_cycle,
+        interval=interval, jitter=jitter, packet_loss=packet_loss,
+        reordered=reordered, duplicates=duplicates, loss_burst=loss_burst,
+        superseded=0, max_burst=1, percentiles_5s=percentiles['5s'],
+        percentiles_1m=percentiles['1m'],
+        percentiles_session=percentiles['session'], remotes=1,
+        remote=remote_control.status)
+
+    controller = motion_complex.ComplexMotionController()
+    controller.update_joystick(_joystick())
+    timing = loop_timing.LoopTiming(receiver.RemoteControlReceiver.INTERVAL)
+    for stage in timing.STAGES:
+        timing.record(stage, 0.001)
+    return sofa.SofaStatus(receiver=receiver_status,
+                           roboteq=roboteq.Roboteq(path=None).status,
+                           controller=controller.status, timestamp=0.0,
+                           runtime=0.0, timing=timing.status)
+
+
+@benchmark
+def Status___render():
+    _status = _sofa_status()
+    return lambda: _status._render('dashboard')
+
+
+@benchmark
+def Status__as_dict():
+    _status = _sofa_status()
+    return lambda: _status.as_dict
+
+
+def _controller_benchmarks():
+    cases = [('ForwardMC', ForwardMC, _joystick(135, 231)),
+             ('ReverseMC', ReverseMC, _joystick(135, 31)),
+             ('SpinMC', SpinMC, _joystick(230, 130, button_c=True)),
+             ('CrawlMC', CrawlMC, _joystick(230, 130, button_c=True)),
+             ('ComplexMotionController',
+              motion_complex.ComplexMotionController, _joystick(200, 200))]
+    for name, controller_class, _joy in cases:
+
+        def process_update(controller_class=controller_class, _joy=_joy):
+            controller = controller_class()
+            controller.update_joystick(_joy)
+            return controller._process_update
+
+        def motor_speeds(controller_class=controller_class, _joy=_joy):
+            controller = controller_class()
+            controller.update_joystick(_joy)
+            return lambda: controller.motor_speeds
+
+        BENCHMARKS.append((name + '._process_update', process_update))
+        BENCHMARKS.append((name + '.motor_speeds', motor_speeds))
+
+
+_controller_benchmarks()
+
+
+@benchmark
+def AccelerationLimiter__limit():
+    limiter = accel_limit.AccelerationLimiter()
+    return lambda: limiter.limit(500, 100, 0.1)
+
+
+def _reference():
+    # plain interpreter work: loops, arithmetic and builtin calls
+    total = 0
+    for i in xrange(100):
+        total += abs(i - 50) * 3 // 2
+    return total
+
+
+def _calibrate(timer):
+    """enough calls for about 0.1s a run"""
+    calls = 1
+    while True:
+        elapsed = timer.timeit(calls)
+        if elapsed >= 0.01:
+            return max(1, int(calls * 0.1 / elapsed))
+        calls *= 10
+
+
+def _time(func, repeat, number):
+    """
+    (best microseconds per call, that relative to the reference workload),
+    timing the two alternately so they see the same conditions
+    """
+    timer = timeit.Timer(func)
+    reference = timeit.Timer(_reference)
+    calls = number or _calibrate(timer)
+    reference_calls = number or _calibrate(reference)
+    best = best_reference = float('inf')
+    for _ in range(repeat):
+        best = min(best, timer.timeit(calls) / calls)
+        best_reference = min(best_reference,
+                             reference.timeit(reference_calls) /
+                             reference_calls)
+    return 1e6 * best, best / best_reference
+
+
+def run(names=None, repeat=5, number=None):
+    """{name: {'usecs': best microseconds per call, 'relative': ...}}"""
+    virtual_clock = clock.VirtualClock(clock.monotonic())
+    clock.use(virtual_clock)
+    try:
+        results = {}
+        for name, setup in BENCHMARKS:
+            if names and name not in names:
+                continue
+            usecs, relative = _time(setup(), repeat, number)
+            results[name] = {'usecs': usecs, 'relative': relative}
+        return results
+    finally:
+        clock.use()
+
+
+def compare(results, baseline):
+    """
+    (name, usecs, baseline usecs, change, regressed) for each result, with
+    the change measured relative to the reference workload
+    """
+    rows = []
+    for name, _ in BENCHMARKS:
+        if name not in results:
+            continue
+        result = results[name]
+        base = baseline.get(name)
+        if not base:
+            rows.append((name, result['usecs'], None, None, False))
+            continue
+        change = (result['relative'] - base['relative']) / base['relative']
+        threshold = THRESHOLDS.get(name, DEFAULT_THRESHOLD)
+        rows.append((name, result['usecs'], base['usecs'], change,
+                     change > threshold and
+                     change * base['usecs'] > NOISE_FLOOR))
+    return rows
+
+
+def recheck(results, baseline, repeat=5, number=None):
+    """
+    rerun anything that looks like a regression, up to RECHECKS times,
+    keeping each benchmark's best run
+    """
+    for _ in range(RECHECKS):
+        regressed = [row[0] for row in compare(results, baseline) if row[4]]
+        if not regressed:
+            break
+        for name, result in run(regressed, repeat, number).iteritems():
+            if result['relative'] < results[name]['relative']:
+                results[name] = result
+    return results
+
+
+def main():
+    """run the benchmarks, and compare them with (or save) the baseline"""
+    parser = OptionParser()
+    parser.add_option('-b', '--baseline', dest='baseline',
+                      default=BASELINE_PATH,
+                      help="baseline json file")
+    parser.add_option('-s', '--save', dest='save', action='store_true',
+                      default=False,
+                      help="save the results as the new baseline")
+    parser.add_option('-r', '--repeat', dest='repeat', type='int',
+                      default=5,
+                      help="take the best of this many runs")
+    parser.add_option('-n', '--number', dest='number', type='int',
+                      default=None,
+                      help="calls per run (default: about 0.1s worth)")
+    parser.add_option('-k', '--only', dest='only', action='append',
+                      default=None,
+                      help="only run this benchmark (repeatable)")
+    (options, _) = parser.parse_args()
+
+    mismatches = nunchuk_joystick.check_table()
+    if mismatches:
+        print 'the joystick table disagrees with the math at %d raw x,y ' \
+            'pairs, eg. %s' % (len(mismatches), mismatches[:5])
+        sys.exit(1)
+
+    results = run(options.only, options.repeat, options.number)
+
+    baseline = {}
+    if os.path.exists(options.baseline):
+        with open(options.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    if not options.save:
+        results = recheck(results, baseline, options.repeat, options.number)
+
+    regressions = 0
+    for name, usecs, base, change, regressed in compare(results, baseline):
+        if base is None:
+            print '%-40s %9.2fus' % (name, usecs)
+            continue
+        print '%-40s %9.2fus %9.2fus %+6.1f%%%s' % (
+            name, usecs, base, 100 * change, ' REGRESSION' if regressed
+            else '')
+        regressions += regressed
+
+    if options.save:
+        baseline.update(results)
+        with open(options.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, sort_keys=True, indent=4,
+                      separators=(',', ': '))
+    elif regressions:
+        print '%d regression(s)' % regressions
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+nunchuk calibration profiles, loaded from a config file and picked per
+remote.  a config file looks like:
+
+    [profile:spare]
+    left = 10
+    center = 128
+    right = 245
+    top = 240
+    middle = 126
+    bottom = 15
+    deadzone = 8
+
+    [remotes]
+    default = oem
+    192.168.1.42 = spare
+    192.168.1.43 = auto
+
+oem and wireless are built in.  every profile is compiled into a decode
+table when the file is loaded.  auto learns a remote's center and extents
+from its packets instead.
+"""
+import ConfigParser
+import threading
+
+import joystick
+import nunchuk_joystick
+
+AUTO = 'auto'
+DEFAULT = 'default'
+_PROFILE_PREFIX = 'profile:'
+
+
+class CalibrationError(Exception):
+    pass
+
+
+def _near_nominal(center, middle, tolerance):
+    """whether center, middle is within tolerance of a built in profile's"""
+    for cal in nunchuk_joystick.PROFILES.itervalues():
+        if abs(center - cal.center) <= tolerance and \
+                abs(middle - cal.middle) <= tolerance:
+            return True
+    return False
+
+
+class AutoCalibration(nunchuk_joystick.Decoder):
+    """
+    learns a remote's calibration from its packets.  the center is taken
+    from CENTER_SAMPLES packets in a row with the stick at rest: spread no
+    more than CENTER_SPREAD, and within CENTER_TOLERANCE of a built in
+    profile's center.  otherwise (say the stick was pushed when the remote
+    turned up) learning starts over, and the stick reads as centered until
+    a center is accepted.  the extents start at the oem span around that
+    center, and only grow when the stick goes past them, so a small push is
+    never mistaken for a full one.
+    until the extents have stopped growing for SETTLE_PACKETS packets,
+    readings are decoded the long way; after that a table is compiled (off
+    the control loop) and used like any other.
+    """
+    CENTER_SAMPLES = 10
+    CENTER_SPREAD = 4
+    CENTER_TOLERANCE = 10
+    SETTLE_PACKETS = 100
+
+    def __init__(self, deadzone=nunchuk_joystick.JOY_DEADZONE):
+        super(AutoCalibration, self).__init__(nunchuk_joystick.OEM)
+        self._table = None
+        self._deadzone = deadzone
+        self._samples = []
+        self._extents = None
+        self._unchanged = 0
+        self._compiling = False
+
+    def decode(self, raw_x, raw_y, button_z, button_c, recv_time):
+        self._observe(raw_x, raw_y)
+        if self._table is not None:
+            return super(AutoCalibration, self).decode(
+                raw_x, raw_y, button_z, button_c, recv_time)
+        if self._extents is None:
+            magnitude, angle = 0, 0
+        else:
+            magnitude, angle = nunchuk_joystick._raw_vector(
+                raw_x, raw_y, self.calibration)
+        return joystick.Joystick._make(
+            (magnitude, angle, button_z, button_c, recv_time))
+
+    def _observe(self, raw_x, raw_y):
+        if self._extents is None:
+            self._samples.append((raw_x, raw_y))
+            if len(self._samples) < self.CENTER_SAMPLES:
+                return
+            xs = [x for x, _ in self._samples]
+            ys = [y for _, y in self._samples]
+            self._samples = []
+            if max(xs) - min(xs) > self.CENTER_SPREAD or \
+                    max(ys) - min(ys) > self.CENTER_SPREAD:
+                return
+            center = sum(xs) // len(xs)
+            middle = sum(ys) // len(ys)
+            if not _near_nominal(center, middle, self.CENTER_TOLERANCE):
+                return
+            oem = nunchuk_joystick.OEM
+            self._extents = [max(center - (oem.center - oem.left), 0),
+                             min(center + (oem.right - oem.center), 255),
+                             max(middle - (oem.middle - oem.bottom), 0),
+                             min(middle + (oem.top - oem.middle), 255)]
+            self._center = center, middle
+            self._samples = None
+            self._learned()
+            return
+
+        left, right, bottom, top = self._extents
+        if raw_x < left or raw_x > right or raw_y < bottom or raw_y > top:
+            self._extents = [min(left, raw_x), max(right, raw_x),
+                             min(bottom, raw_y), max(top, raw_y)]
+            self._learned()
+            return
+
+        self._unchanged += 1
+        # >=, a compile of an older calibration may still have been running
+        # when this one settled
+        if self._unchanged >= self.SETTLE_PACKETS and \
+                self._table is None and not self._compiling:
+            self._compiling = True
+            thread = threading.Thread(target=self._compile,
+                                      args=(self.calibration,),
+                                      name='calibration')
+            thread.daemon = True
+            thread.start()
+
+    def _learned(self):
+        left, right, bottom, top = self._extents
+        self.calibration = nunchuk_joystick.Calibration(
+            left=left, center=self._center[0], right=right, top=top,
+            middle=self._center[1], bottom=bottom, deadzone=self._deadzone)
+        self._table = None
+        self._unchanged = 0
+
+    def _compile(self, cal):
+        # not table_for, there's no point keeping every table we learn
+        table = nunchuk_joystick.build_table(cal)
+        # only if nothing new was learned in the meantime
+        if cal == self.calibration:
+            self._table = table
+        self._compiling = False
+
+
+def _check_ranges(cal):
+    """raises CalibrationError if any side of the stick has no range left"""
+    if cal.deadzone < 0:
+        raise CalibrationError("negative deadzone")
+    for low, mid, high in ((cal.left, cal.center, cal.right),
+                           (cal.bottom, cal.middle, cal.top)):
+        # anything past the deadzone and short of an extent is scaled, so
+        # there must be something in between
+        if not low < mid - cal.deadzone < mid + cal.deadzone < high:
+            raise CalibrationError(
+                "%d, %d, %d leaves no range outside a deadzone of %d" %
+                (low, mid, high, cal.deadzone))
+
+
+def _read_profile(parser, section):
+    try:
+        values = {}
+        for field in nunchuk_joystick.Calibration._fields:
+            values[field] = parser.getint(section, field)
+        cal = nunchuk_joystick.Calibration(**values)
+        _check_ranges(cal)
+    except (ConfigParser.Error, ValueError, CalibrationError) as exc:
+        raise CalibrationError("[%s]: %s" % (section, exc))
+    return cal
+
+
+class Calibrations(object):
+    """the calibration profiles, and which remote uses which"""
+
+    def __init__(self, path=None):
+        self._profiles = dict(nunchuk_joystick.PROFILES)
+        self._remotes = {}
+        self._default = 'oem'
+        if path:
+            self.load(path)
+
+    def load(self, path):
+        parser = ConfigParser.SafeConfigParser()
+        if not parser.read(path):
+            raise CalibrationError("can't read %s" % path)
+
+        for section in parser.sections():
+            if section.startswith(_PROFILE_PREFIX):
+                name = section[len(_PROFILE_PREFIX):]
+                self._profiles[name] = _read_profile(parser, section)
+
+        if parser.has_section('remotes'):
+            for remote, name in parser.items('remotes'):
+                if name != AUTO and name not in self._profiles:
+                    raise CalibrationError("[remotes] %s: no profile %s" %
+                                           (remote, name))
+                if remote == DEFAULT:
+                    self._default = name
+                else:
+                    self._remotes[remote] = name
+
+        # compile every table now, rather than when a remote turns up
+        for cal in self._profiles.itervalues():
+            nunchuk_joystick.table_for(cal)
+
+    def decoder(self, addr):
+        """a Decoder for the remote at addr, an (ip, port)"""
+        name = self._remotes.get(addr[0], self._default)
+        if name == AUTO:
+            return AutoCalibration()
+        return nunchuk_joystick.Decoder(self._profiles[name])
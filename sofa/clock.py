@@ -0,0 +1,67 @@
+"""
+a monotonic clock, which wall clock steps can't disturb.
+
+everything reads the time through clock.monotonic(), so a replay can swap
+in a VirtualClock with use() and run the sofa's logic faster than real time.
+"""
+import ctypes
+import time
+
+CLOCK_MONOTONIC = 1
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _libc_monotonic():
+    """build a monotonic() from libc's clock_gettime"""
+    clock_gettime = ctypes.CDLL(None, use_errno=True).clock_gettime
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_Timespec)]
+
+    def monotonic():
+        """seconds since some arbitrary, fixed point in the past"""
+        timespec = _Timespec()
+        if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(timespec)) != 0:
+            raise OSError(ctypes.get_errno(), 'clock_gettime failed')
+        return timespec.tv_sec + timespec.tv_nsec * 1e-9
+
+    return monotonic
+
+
+if hasattr(time, 'monotonic'):
+    monotonic = time.monotonic
+else:
+    try:
+        monotonic = _libc_monotonic()
+        monotonic()
+    except (AttributeError, OSError):
+        # no clock_gettime, so put up with the wall clock
+        monotonic = time.time
+
+
+def from_realtime(timestamp):
+    """convert a wall clock (eg. kernel packet) timestamp to monotonic()"""
+    return timestamp - (time.time() - monotonic())
+
+
+class VirtualClock(object):
+    """a clock that only moves when it's told to"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def set(self, now):
+        self.now = now
+
+
+_real_monotonic = monotonic
+
+
+def use(source=None):
+    """read the time from source (eg. a VirtualClock), or the real clock"""
+    global monotonic
+    monotonic = source or _real_monotonic
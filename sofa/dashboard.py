@@ -0,0 +1,56 @@
+"""a console dashboard that stays off the control loop"""
+import sys
+import threading
+import time
+
+
+class ConsoleDashboard(object):
+    """
+    renders the status dashboard from its own thread, at its own refresh
+    rate, and only while a terminal or a subscriber is watching.  a slow
+    terminal or ssh session can hold up the dashboard, but never the sofa.
+    """
+
+    def __init__(self, stream=sys.stdout, interval=0.25):
+        self._stream = stream
+        self._interval = interval
+        self._subscribers = []
+        self._latest = None
+        self._thread = None
+        try:
+            self._to_stream = stream.isatty()
+        except AttributeError:
+            self._to_stream = False
+        if self._to_stream:
+            self._start()
+
+    def subscribe(self, callback):
+        """call callback(line) with every rendered dashboard line"""
+        self._subscribers.append(callback)
+        self._start()
+
+    def submit(self, _status):
+        """hand over a new status, without rendering it"""
+        if self._thread:
+            self._latest = _status
+
+    def _start(self):
+        if self._thread or not self._interval:
+            return
+        self._thread = threading.Thread(target=self._run, name='dashboard')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self._interval)
+            _status, self._latest = self._latest, None
+            if _status is None:
+                continue
+
+            line = _status.dashboard
+            if self._to_stream:
+                self._stream.write(line + "\n")
+                self._stream.flush()
+            for callback in self._subscribers:
+                callback(line)
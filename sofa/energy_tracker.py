@@ -1,6 +1,6 @@
 '''A roboteq RS232 motor controller with accel/deccel enforcement'''
-import time
 
+import clock
 import status
 
 
@@ -21,10 +21,10 @@ class EnergyTracker(object):
     _amps_r = 0
     _watt_hours = 0
     _regen_watt_hours = 0
-    _last_update_ts = time.time()
+    _last_update_ts = clock.monotonic()
 
     def update(self, volts, amps_l, amps_r):
-        now = time.time()
+        now = clock.monotonic()
         duration = now - self._last_update_ts
         self._last_update_ts = now
 
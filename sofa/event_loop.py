@@ -0,0 +1,101 @@
+"""a small select() based event loop for sockets, pipes and timers"""
+import collections
+import heapq
+import itertools
+import select
+
+import clock
+
+
+class Timer(object):
+    """
+    a callback scheduled on an EventLoop.  repeating timers keep to a fixed
+    phase, counting the ticks they've run and the ones they had to skip.
+    """
+
+    def __init__(self, when, callback, interval=None):
+        self.when = when
+        self.callback = callback
+        self.interval = interval
+        self.cancelled = False
+        self.ticks = 0
+        self.skipped = 0
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class EventLoop(object):
+    """
+    dispatches readable file descriptors first, then due timers, and only
+    runs idle callbacks when nothing else is waiting
+    """
+
+    def __init__(self):
+        self._readers = {}
+        self._timers = []
+        self._idle = collections.deque()
+        self._seq = itertools.count()
+
+    def add_reader(self, fileobj, callback):
+        """call callback() whenever fileobj (with a fileno) is readable"""
+        self._readers[fileobj.fileno()] = callback
+
+    def remove_reader(self, fileobj):
+        self._readers.pop(fileobj.fileno(), None)
+
+    def call_later(self, delay, callback):
+        return self._schedule(Timer(clock.monotonic() + delay, callback))
+
+    def call_every(self, interval, callback):
+        return self._schedule(Timer(clock.monotonic() + interval, callback,
+                                    interval))
+
+    def call_idle(self, callback):
+        """run callback once, as soon as there's nothing else to do"""
+        self._idle.append(callback)
+
+    def _schedule(self, timer):
+        heapq.heappush(self._timers, (timer.when, next(self._seq), timer))
+        return timer
+
+    def _timeout(self):
+        if self._idle:
+            return 0
+        while self._timers and self._timers[0][2].cancelled:
+            heapq.heappop(self._timers)
+        if not self._timers:
+            return None
+        return max(0, self._timers[0][0] - clock.monotonic())
+
+    def run_once(self):
+        readable, _, _ = select.select(list(self._readers), [], [],
+                                       self._timeout())
+        for fileno in readable:
+            callback = self._readers.get(fileno)
+            if callback:
+                callback()
+
+        now = clock.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            _, _, timer = heapq.heappop(self._timers)
+            if timer.cancelled:
+                continue
+            if timer.interval:
+                timer.ticks += 1
+                timer.when += timer.interval
+                if timer.when <= now:
+                    # we fell behind.  skip the ticks we missed, but stay in
+                    # phase with the original schedule rather than drifting
+                    missed = int((now - timer.when) / timer.interval) + 1
+                    timer.skipped += missed
+                    timer.when += missed * timer.interval
+                self._schedule(timer)
+            timer.callback()
+
+        if self._idle and not readable:
+            self._idle.popleft()()
+
+    def run(self):
+        while True:
+            self.run_once()
@@ -0,0 +1,159 @@
+#!/usr/bin/python
+"""
+a flight recorder: one fixed size binary record per control cycle, in a
+preallocated, memory mapped ring file, so there's a record of what the
+sofa did (and why) after an incident.
+
+the header holds the index of the next record to write, bumped only after
+the record is complete, so a reader never sees a half written record
+unless it's lapped by the writer.
+"""
+import csv
+import mmap
+import os
+import struct
+import sys
+import time
+from optparse import OptionParser
+
+MAGIC = 'SOFR'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sHHIQ')
+_NEXT_OFFSET = 12
+_NEXT = struct.Struct('<Q')
+
+FIELDS = [
+    ('time', 'd'), ('monotonic', 'd'),
+    # the raw joystick packet.  legacy text packets aren't limited to a byte
+    ('raw_x', 'h'), ('raw_y', 'h'), ('button_z', '?'), ('button_c', '?'),
+    ('seq', 'I'),
+    # the joystick as decoded with the remote's calibration
+    ('magnitude', 'B'), ('angle', 'H'),
+    # the motion controller
+    ('mode', '8s'), ('submode', '8s'), ('target_l', 'f'), ('target_r', 'f'),
+    # the roboteq, after acceleration limiting
+    ('speed_l', 'f'), ('speed_r', 'f'), ('brake', '?'),
+    ('volts', 'f'), ('amps_l', 'f'), ('amps_r', 'f'), ('watt_hours', 'f'),
+    ('regen_watt_hours', 'f'),
+]
+FIELD_NAMES = [name for name, _ in FIELDS]
+
+RECORD = struct.Struct('<' + ''.join([fmt for _, fmt in FIELDS]))
+
+# an hour at 10 cycles a second
+DEFAULT_RECORDS = 36000
+
+
+def _size(records):
+    return _HEADER.size + records * RECORD.size
+
+
+class FlightRecorder(object):
+    """the writer side, owned by the sofa"""
+
+    def __init__(self, path, records=DEFAULT_RECORDS):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, _size(records))
+            self._map = mmap.mmap(fd, _size(records))
+        finally:
+            os.close(fd)
+        self._records = records
+        self.errors = 0
+        # carry on after an existing recording, so a restart (eg. by the
+        # babysitter) doesn't wipe out the cycles leading up to it
+        magic, version, record_size, old_records, self._next = \
+            _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or \
+                record_size != RECORD.size or old_records != records:
+            self._next = 0
+        _HEADER.pack_into(self._map, 0, MAGIC, VERSION, RECORD.size,
+                          records, self._next)
+
+    def record(self, *fields):
+        """
+        append a record, with fields in FIELD_NAMES order.  a record that
+        can't be packed is dropped and counted in errors, the recorder must
+        never stop the control loop.
+        """
+        offset = _HEADER.size + (self._next % self._records) * RECORD.size
+        try:
+            RECORD.pack_into(self._map, offset, *fields)
+        except (struct.error, TypeError, ValueError, EnvironmentError) as exc:
+            self.errors += 1
+            if self.errors == 1:
+                print >> sys.stderr, "can't record a cycle: %s" % exc
+            return
+        self._next += 1
+        _NEXT.pack_into(self._map, _NEXT_OFFSET, self._next)
+
+
+class FlightRecorderReader(object):
+    """the reader side, for looking back at what happened"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as recording:
+            self._map = mmap.mmap(recording.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        magic, version, record_size, self._records, _ = \
+            _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or \
+                record_size != RECORD.size:
+            raise ValueError("%s is not a version %d flight recording" %
+                             (path, VERSION))
+
+    def __iter__(self):
+        """records as dicts, oldest first"""
+        written = _NEXT.unpack_from(self._map, _NEXT_OFFSET)[0]
+        for i in xrange(max(written - self._records, 0), written):
+            offset = _HEADER.size + (i % self._records) * RECORD.size
+            record = dict(zip(FIELD_NAMES,
+                              RECORD.unpack_from(self._map, offset)))
+            record['mode'] = record['mode'].rstrip('\0')
+            record['submode'] = record['submode'].rstrip('\0')
+            yield record
+
+    def between(self, start=None, end=None):
+        """records with a wall clock time from start to end"""
+        for record in self:
+            if start is not None and record['time'] < start:
+                continue
+            if end is not None and record['time'] > end:
+                continue
+            yield record
+
+
+def _parse_time(value):
+    """seconds since the epoch, or negative seconds before now"""
+    if value is None:
+        return None
+    value = float(value)
+    if value < 0:
+        return time.time() + value
+    return value
+
+
+def main():
+    """export a time range of the flight recording as csv"""
+    parser = OptionParser()
+    parser.add_option('-p', '--path', dest='path',
+                      default="/var/run/sofa_flight",
+                      help="path to the flight recording")
+    parser.add_option('-s', '--start', dest='start', default=None,
+                      help="export from this time (seconds since the "
+                      "epoch, or negative for seconds ago)")
+    parser.add_option('-e', '--end', dest='end', default=None,
+                      help="export until this time")
+    (options, _) = parser.parse_args()
+
+    reader = FlightRecorderReader(options.path)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(FIELD_NAMES)
+    for record in reader.between(_parse_time(options.start),
+                                 _parse_time(options.end)):
+        writer.writerow([record[name] for name in FIELD_NAMES])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+fixed memory latency histograms.
+
+values (integers, microseconds as used here) go into log-linear buckets
+in the style of HdrHistogram: every power of two range is split into
+2**SUB_BITS linear sub-buckets, so a bucket is never wider than 1/16 of
+the values in it, however large they get.
+"""
+import array
+
+SUB_BITS = 4
+SUB_COUNT = 1 << SUB_BITS
+# values up to 2**MAX_BITS (about 67s in microseconds), larger ones are
+# counted in the top bucket
+MAX_BITS = 26
+BUCKETS = SUB_COUNT * (MAX_BITS - SUB_BITS + 1)
+
+
+def bucket_index(value):
+    if value < 2 * SUB_COUNT:
+        return max(int(value), 0)
+    shift = int(value).bit_length() - SUB_BITS - 1
+    return min(SUB_COUNT * shift + (int(value) >> shift), BUCKETS - 1)
+
+
+def bucket_value(index):
+    """the highest value that lands in bucket index"""
+    if index < 2 * SUB_COUNT:
+        return index
+    shift = index // SUB_COUNT - 1
+    return ((index - SUB_COUNT * shift + 1) << shift) - 1
+
+
+class Histogram(object):
+    """bucket counts, plus the exact max"""
+
+    def __init__(self):
+        self.clear()
+
+    def record(self, value):
+        self.record_index(bucket_index(value), value)
+
+    def record_index(self, index, value):
+        """record value, already known to belong in bucket index"""
+        self.counts[index] += 1
+        self.total += 1
+        if value > self.max:
+            self.max = value
+
+    def clear(self):
+        self.counts = array.array('L', [0]) * BUCKETS
+        self.total = 0
+        self.max = 0
+
+    def subtract(self, other):
+        """take a _SlotHistogram's counts back out, but not its max"""
+        counts = self.counts
+        for i, count in other.counts.iteritems():
+            counts[i] -= count
+        self.total -= other.total
+
+    def percentiles(self, fractions):
+        """
+        the value at each of fractions (sorted, 0 to 1), in one pass over
+        the buckets, followed by the max.  values are reported at their
+        bucket's upper edge, capped at the max.
+        """
+        results = []
+        if not self.total:
+            return [0] * (len(fractions) + 1)
+        pending = iter(fractions)
+        fraction = next(pending)
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if not count:
+                continue
+            seen += count
+            while seen >= fraction * self.total:
+                results.append(min(bucket_value(i), self.max))
+                fraction = next(pending, None)
+                if fraction is None:
+                    return results + [self.max]
+        while len(results) < len(fractions):
+            results.append(self.max)
+        return results + [self.max]
+
+
+class _SlotHistogram(Histogram):
+    """
+    one slot of a RollingHistogram, which only keeps the buckets it has
+    touched: a slot sees a second's worth of values, and a full set of
+    buckets for each would make every remote's RollingHistograms hundreds
+    of KB
+    """
+
+    def record_index(self, index, value):
+        counts = self.counts
+        counts[index] = counts.get(index, 0) + 1
+        self.total += 1
+        if value > self.max:
+            self.max = value
+
+    def clear(self):
+        self.counts = {}
+        self.total = 0
+        self.max = 0
+
+
+class RollingHistogram(object):
+    """
+    histograms of several metrics over the last slots * slot_length
+    seconds, kept as one histogram per metric per slot and a running
+    aggregate of each.  recording touches two buckets per metric, and an
+    expiring slot is subtracted once, bucket by touched bucket.  a slot's
+    histograms are made when it's first recorded into.
+    """
+
+    def __init__(self, slots, slot_length=1.0, metrics=1):
+        self._slot_length = slot_length
+        self._metrics = metrics
+        self._slots = [None] * slots
+        self._aggregates = [Histogram() for _ in range(metrics)]
+        self._current = None
+
+    def _rotate(self, now):
+        current = int(now // self._slot_length)
+        if current == self._current:
+            return
+        if self._current is None:
+            self._current = current
+        # expire every slot we've moved past, but never more than once
+        steps = min(current - self._current, len(self._slots))
+        for step in range(1, steps + 1):
+            slot = self._slots[(self._current + step) % len(self._slots)]
+            if slot is None:
+                continue
+            for aggregate, hist in zip(self._aggregates, slot):
+                if hist.total:
+                    aggregate.subtract(hist)
+                    hist.clear()
+        self._current = max(current, self._current)
+
+    def record(self, now, *values):
+        """record a value for each metric"""
+        self.record_indexes(now, [(bucket_index(value), value)
+                                  for value in values])
+
+    def record_indexes(self, now, indexed):
+        """record an (index, value), from bucket_index, for each metric"""
+        self._rotate(now)
+        slot = self._slots[self._current % len(self._slots)]
+        if slot is None:
+            slot = self._slots[self._current % len(self._slots)] = \
+                [_SlotHistogram() for _ in range(self._metrics)]
+        for hist, aggregate, (index, value) in zip(slot, self._aggregates,
+                                                   indexed):
+            hist.record_index(index, value)
+            aggregate.record_index(index, value)
+
+    def percentiles(self, now, fractions, metric=0):
+        """like Histogram.percentiles, as of now"""
+        self._rotate(now)
+        results = self._aggregates[metric].percentiles(fractions)[:-1]
+        # the aggregate's max never comes down, the slots' maxes do
+        window_max = max([slot[metric].max for slot in self._slots if slot] or
+                         [0])
+        return [min(value, window_max) for value in results] + [window_max]
@@ -1,9 +1,31 @@
 """get magnitude/angle vectors from a remote wii nunchuck"""
 
-import time
-
+import clock
 import status
 
+# the remote sends a reading this often
+REMOTE_INTERVAL = 0.1
+# the receiver gives up waiting for a reading this fraction of an interval
+# after it was due
+TIMEOUT_GRACE = 0.1
+# how late a reading can be on an ordinary (jittery) wifi link
+JITTER_MARGIN = 0.05
+# a joystick reading older than this is overdue, and reads as centered.
+# no later than the receiver's timeout, so a stick whose link has stopped
+# never drives another cycle
+MAX_AGE = REMOTE_INTERVAL * (1 + TIMEOUT_GRACE)
+# at a fixed control rate, ticks don't wait for readings, so one can land
+# just after a reading was due; ordinary jitter mustn't center the stick
+FIXED_RATE_MAX_AGE = REMOTE_INTERVAL + JITTER_MARGIN
+
+_max_age = MAX_AGE
+
+
+def use_max_age(max_age=None):
+    """read joysticks older than max_age as centered, or MAX_AGE"""
+    global _max_age
+    _max_age = max_age or MAX_AGE
+
 
 class Joystick(status.Status):
     _attrs = ['magnitude', 'angle', 'button_z', 'button_c', 'recv_time']
@@ -29,13 +51,13 @@ class Joystick(status.Status):
 
     @property
     def magnitude(self):
-        if self.age > 0.1:
+        if self.age > _max_age:
             return 0
         return self[0]
 
     @property
     def age(self):
-        return time.time() - self[4]
+        return clock.monotonic() - self[4]
 
     @property
     def status(self):
@@ -57,7 +79,7 @@ def new_centered(last_joystick=None):
         recv_time = last_joystick.recv_time
     else:
         # by default return one that is already expired
-        recv_time = time.time() - 10.0
+        recv_time = clock.monotonic() - 10.0
 
     return Joystick(
         magnitude=0,
@@ -0,0 +1,87 @@
+"""per-stage timing of the control loop"""
+import collections
+
+import clock
+import status
+
+
+class StageTimingStatus(status.Status):
+    _attrs = ['p50', 'p95', 'p99', 'max']
+    _dashboard_fmt = ['{p50:5.1f}', '{p95:5.1f}', '{p99:5.1f}',
+                      '{max:5.1f}ms']
+
+
+class LoopTimingStatus(status.Status):
+    _attrs = ['wait_for_update', 'update_joystick', 'motor_speeds',
+              'set_speed', 'update_status', 'cycles', 'overruns', 'skipped']
+    _dashboard_fmt = ['{overruns:d}/{cycles:d} overruns',
+                      '{skipped:d} skipped']
+
+
+def _percentile(ordered, pct):
+    return ordered[int(round(pct * (len(ordered) - 1)))]
+
+
+class LoopTiming(object):
+    """rolling timing histograms for each stage of the control loop"""
+    STAGES = ['wait_for_update', 'update_joystick', 'motor_speeds',
+              'set_speed', 'update_status']
+
+    def __init__(self, budget, window=100):
+        self._budget = budget
+        self._samples = {}
+        for stage in self.STAGES:
+            self._samples[stage] = collections.deque(maxlen=window)
+        self._cycles = 0
+        self._overruns = 0
+        self._skipped = 0
+        self._cycle_start = 0
+        self._busy_start = 0
+        self._last = 0
+
+    @property
+    def cycle_start(self):
+        return self._cycle_start
+
+    def start_cycle(self):
+        self._last = self._cycle_start = clock.monotonic()
+        self._busy_start = self._cycle_start
+
+    def set_skipped(self, skipped):
+        """the number of fixed rate cycles that were skipped altogether"""
+        self._skipped = skipped
+
+    def record(self, stage, seconds):
+        self._samples[stage].append(seconds)
+
+    def lap(self, stage):
+        """record the time spent in stage since the previous lap"""
+        now = clock.monotonic()
+        self.record(stage, now - self._last)
+        if stage == 'wait_for_update':
+            self._busy_start = now
+        self._last = now
+
+    def end_cycle(self):
+        """count the cycle, and whether its work overran the budget"""
+        self._cycles += 1
+        if self._last - self._busy_start > self._budget:
+            self._overruns += 1
+
+    def _stage_status(self, stage):
+        samples = self._samples[stage]
+        if not samples:
+            return StageTimingStatus(p50=0.0, p95=0.0, p99=0.0, max=0.0)
+        ordered = sorted(samples)
+        return StageTimingStatus(p50=1000 * _percentile(ordered, 0.50),
+                                 p95=1000 * _percentile(ordered, 0.95),
+                                 p99=1000 * _percentile(ordered, 0.99),
+                                 max=1000 * ordered[-1])
+
+    @property
+    def status(self):
+        stages = {}
+        for stage in self.STAGES:
+            stages[stage] = self._stage_status(stage)
+        return LoopTimingStatus(cycles=self._cycles, overruns=self._overruns,
+                                skipped=self._skipped, **stages)
@@ -2,6 +2,9 @@
 
 E = 2.7182
 
+# the ACCEL_PROFILES rates are per update, at this many seconds per update
+UPDATE_INTERVAL = 0.1
+
 ACCEL_PROFILES = {
     'NORMAL': [0.03, 0.05],
     'TURBO': [0.1, 0.05],
@@ -28,19 +31,22 @@ def linear_map(i, i_min, i_max, o_min, o_max):
     return out
 
 
-def process_accel(target_speed, current_speed, accel_profile):
-    """do the accel/decel thing"""
+def process_accel(target_speed, current_speed, accel_profile, scale=1.0):
+    """
+    do the accel/decel thing.  scale adjusts the rates for controllers that
+    are updated more or less often than every UPDATE_INTERVAL.
+    """
 
     if target_speed > current_speed:
         # accelerate
-        accel_rate = ACCEL_PROFILES[accel_profile][0]
+        accel_rate = ACCEL_PROFILES[accel_profile][0] * scale
         current_speed += accel_rate
         if current_speed > target_speed:
             current_speed = target_speed
 
     elif target_speed < current_speed:
         # deccelerate
-        decel_rate = ACCEL_PROFILES[accel_profile][1]
+        decel_rate = ACCEL_PROFILES[accel_profile][1] * scale
         current_speed -= decel_rate
         if current_speed < target_speed:
             current_speed = target_speed
@@ -56,6 +62,8 @@ def cuberoot(scalar):
 class MotionController(object):
     _name = ""
     _joystick = None
+    _update_interval = UPDATE_INTERVAL
+    _accel_scale = 1.0
 
     @property
     def name(self):
@@ -64,6 +72,11 @@ class MotionController(object):
     def _process_update(self):
         pass
 
+    def set_update_interval(self, interval):
+        """tell the controller how many seconds pass between updates"""
+        self._update_interval = interval
+        self._accel_scale = interval / UPDATE_INTERVAL
+
     def update_joystick(self, joystick):
         self._joystick = joystick
         self._process_update()
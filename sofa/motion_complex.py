@@ -87,6 +87,8 @@ class ComplexMotionController(MotionController):
         # if a controller isn't running, see if one should be:
         if self._online and not self._controller and not self._joystick.centered:
             self._controller = controller_selector(self._joystick)
+            if self._controller:
+                self._controller.set_update_interval(self._update_interval)
 
         if not self._controller:
             return
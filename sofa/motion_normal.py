@@ -131,23 +131,26 @@ class NormalMC(MotionController):
         if accel_profile == 'NORMAL' and self._joystick.button_z:
             accel_profile = 'TURBO'
 
-        self._speed = process_accel(speed, self._speed, accel_profile)
+        scale = self._accel_scale
+        self._speed = process_accel(speed, self._speed, accel_profile, scale)
         self._max_speed = process_accel(
-            max_speed, self._max_speed, accel_profile)
+            max_speed, self._max_speed, accel_profile, scale)
 
         if turn_direction == 'LEFT':
             self._l_speed = process_accel(
-                m2_speed, self._l_speed, accel_profile)
+                m2_speed, self._l_speed, accel_profile, scale)
             self._r_speed = process_accel(
-                m1_speed, self._r_speed, accel_profile)
+                m1_speed, self._r_speed, accel_profile, scale)
         elif turn_direction == 'RIGHT':
             self._l_speed = process_accel(
-                m1_speed, self._l_speed, accel_profile)
+                m1_speed, self._l_speed, accel_profile, scale)
             self._r_speed = process_accel(
-                m2_speed, self._r_speed, accel_profile)
+                m2_speed, self._r_speed, accel_profile, scale)
         else:
-            self._l_speed = process_accel(speed, self._l_speed, accel_profile)
-            self._r_speed = process_accel(speed, self._r_speed, accel_profile)
+            self._l_speed = process_accel(
+                speed, self._l_speed, accel_profile, scale)
+            self._r_speed = process_accel(
+                speed, self._r_speed, accel_profile, scale)
 
     @property
     def motor_speeds(self):
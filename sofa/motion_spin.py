@@ -50,7 +50,8 @@ class SpinMC(MotionController):
             turn_speed = linear_map(angle, 270, 360 - JOY_DEADZONE, 1.0, 0.0)
 
         self._direction = direction
-        self._turn_speed = process_accel(turn_speed, self._turn_speed, 'SPIN')
+        self._turn_speed = process_accel(turn_speed, self._turn_speed, 'SPIN',
+                                         self._accel_scale)
 
     @property
     def motor_speeds(self):
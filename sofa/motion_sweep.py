@@ -0,0 +1,328 @@
+#!/usr/bin/python
+"""
+the steady state motor speeds of the motion controllers over the whole
+input space: every angle, magnitude and Z button, for plotting, or for
+diffing against a saved sweep to see what a change to JOY_MODES, gamma or
+the speed caps really does.
+
+with numpy, each controller's surface is worked out in one vectorized pass
+over the grid, using the same formulas as the controller itself.  without
+it (or with --verify, to check the two agree) each point is run through a
+real controller instance instead, which is much slower.
+"""
+import csv
+import itertools
+import sys
+from optparse import OptionParser
+
+import clock
+import joystick
+import motion
+import motion_normal
+import motion_spin
+from motion_normal import ForwardMC, ReverseMC
+from motion_spin import SpinMC
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ANGLES = range(360)
+MAGNITUDES = range(101)
+BUTTONS = [False, True]
+
+CONTROLLERS = [('FWD', ForwardMC), ('REV', ReverseMC), ('SPIN', SpinMC)]
+
+SWEEP_FIELDS = ['mode', 'angle', 'magnitude', 'button_z', 'submode',
+                'left', 'right']
+
+# long enough between updates that one update reaches the target speeds
+_SETTLE_INTERVAL = 1e6
+
+
+def _linear_map(i, i_min, i_max, o_min, o_max):
+    """motion.linear_map, on arrays"""
+    i = numpy.asarray(i, dtype=float)
+    i_min = numpy.asarray(i_min, dtype=float)
+    i_max = numpy.asarray(i_max, dtype=float)
+    rising = (i - i_min) / (i_max - i_min) * (o_max - o_min) + o_min
+    falling = (1.0 - (i - i_min) / (i_max - i_min)) * (o_min - o_max) + o_max
+    return numpy.where(numpy.asarray(o_max) > o_min, rising, falling)
+
+
+def _grid():
+    """angle, magnitude and button_z arrays, broadcast over the grid"""
+    angle, magnitude, button_z = numpy.meshgrid(
+        numpy.array(ANGLES), numpy.array(MAGNITUDES),
+        numpy.array(BUTTONS), indexing='ij')
+    return angle, magnitude, button_z
+
+
+def _normal_surface(name, angle, magnitude, button_z):
+    """(submodes, left, right) for ForwardMC or ReverseMC"""
+    # decode_turn
+    moving = magnitude > 10
+    right = angle <= 180
+    if name == 'FWD':
+        turn_angle = numpy.where(right, angle, 360 - angle)
+    else:
+        turn_angle = numpy.where(right, 180 - angle, angle - 180)
+    turn_angle = numpy.where(moving, turn_angle, 0)
+    left_turn = moving & ~right
+    right_turn = moving & right
+
+    # decode_submode, which falls through to the last segment at 180
+    modes = motion_normal.JOY_MODES
+    starts = numpy.array([mode[1] for mode in modes])
+    m1_speeds = numpy.array([mode[2] for mode in modes])
+    m2_speeds = numpy.array([mode[3] for mode in modes])
+    segment = numpy.clip(
+        numpy.searchsorted(starts, turn_angle, side='right') - 1,
+        0, len(modes) - 2)
+    m1_speed = _linear_map(turn_angle, starts[segment], starts[segment + 1],
+                           m1_speeds[segment], m1_speeds[segment + 1])
+    m2_speed = _linear_map(turn_angle, starts[segment], starts[segment + 1],
+                           m2_speeds[segment], m2_speeds[segment + 1])
+    names = numpy.array([mode[0] for mode in modes[:-1]] + ['COAST'])
+    coast = magnitude <= 10
+    submodes = names[numpy.where(coast, len(modes) - 1, segment)]
+    m1_speed = numpy.where(coast, 0.0, m1_speed)
+    m2_speed = numpy.where(coast, 0.0, m2_speed)
+
+    # max_speed
+    fraction = (135.0 - turn_angle.astype(float)) / 135.0
+    if name == 'FWD':
+        max_speed = numpy.where(
+            button_z,
+            (motion_normal.TURBO_MAX_FWD_SPEED -
+             motion_normal.TURBO_MAX_TURN_FWD_SPEED) * fraction +
+            motion_normal.TURBO_MAX_TURN_FWD_SPEED,
+            (motion_normal.MAX_FWD_SPEED -
+             motion_normal.MAX_TURN_FWD_SPEED) * fraction +
+            motion_normal.MAX_TURN_FWD_SPEED)
+    else:
+        # sic, ReverseMC tops out at MAX_TURN_FWD_SPEED
+        max_speed = (motion_normal.MAX_REV_SPEED -
+                     motion_normal.MAX_TURN_REV_SPEED) * fraction + \
+            motion_normal.MAX_TURN_FWD_SPEED
+
+    # magnitude is an int array, so gamma's orig / 10 rounds down just as
+    # it does for the controller's int magnitude
+    speed = numpy.where(coast, 0.0, motion.gamma(magnitude) / 100.0)
+    l_speed = numpy.where(left_turn, m2_speed,
+                          numpy.where(right_turn, m1_speed, speed))
+    r_speed = numpy.where(left_turn, m1_speed,
+                          numpy.where(right_turn, m2_speed, speed))
+
+    # motor_speeds
+    left = numpy.sqrt(l_speed * speed) * max_speed * 0.95
+    right = numpy.sqrt(r_speed * speed) * max_speed
+    if name == 'REV':
+        left *= -1.0
+        right *= -1.0
+    return (submodes, left * motion_normal.MOTOR_MULTIPLIER,
+            right * motion_normal.MOTOR_MULTIPLIER)
+
+
+def _spin_surface(angle, magnitude, button_z):
+    """(submodes, left, right) for SpinMC, which only looks at the angle"""
+    deadzone = motion_spin.JOY_DEADZONE
+    dead = (angle < deadzone) | (angle > 360 - deadzone) | \
+        ((angle > 180 - deadzone) & (angle < 180 + deadzone))
+    clockwise = angle <= 180 - deadzone
+    turn_speed = numpy.select(
+        [dead, angle <= 90, clockwise, angle <= 270],
+        [0.0,
+         _linear_map(angle, deadzone, 90, 0.0, 1.0),
+         _linear_map(angle, 90, 180 - deadzone, 1.0, 0.0),
+         _linear_map(angle, 180 + deadzone, 270, 0.0, 1.0)],
+        _linear_map(angle, 270, 360 - deadzone, 1.0, 0.0))
+    submodes = numpy.where(dead, 'NONE',
+                           numpy.where(clockwise, 'RIGHT', 'LEFT'))
+
+    # motor_speeds
+    forward = turn_speed * motion_spin.MAX_SPEED
+    backward = turn_speed * -1.0 * motion_spin.MAX_SPEED
+    left = numpy.where(dead, 0.0, numpy.where(clockwise, forward, backward))
+    right = numpy.where(dead, 0.0, numpy.where(clockwise, backward, forward))
+    return submodes, left, right
+
+
+def surfaces():
+    """
+    {mode: (submodes, left, right)}, each an array indexed by angle,
+    magnitude and button_z, worked out with numpy
+    """
+    angle, magnitude, button_z = _grid()
+    result = {}
+    for name, _ in CONTROLLERS:
+        if name == 'SPIN':
+            result[name] = _spin_surface(angle, magnitude, button_z)
+        else:
+            result[name] = _normal_surface(name, angle, magnitude, button_z)
+    return result
+
+
+def steady_state(controller_class, angle, magnitude, button_z):
+    """
+    (submode, left, right) that a controller settles at with the stick held
+    still, from a real controller instance
+    """
+    controller = controller_class()
+    controller.set_update_interval(_SETTLE_INTERVAL)
+    controller.update_joystick(joystick.Joystick._make(
+        (magnitude, angle, button_z, False, clock.monotonic())))
+    left, right = controller.motor_speeds
+    return controller.submode, float(left), float(right)
+
+
+def controller_surfaces():
+    """surfaces() without numpy, as nested lists, one controller at a time"""
+    virtual_clock = clock.VirtualClock(clock.monotonic())
+    clock.use(virtual_clock)
+    try:
+        result = {}
+        for name, controller_class in CONTROLLERS:
+            submodes, lefts, rights = [], [], []
+            for angle in ANGLES:
+                submode_rows, left_rows, right_rows = [], [], []
+                for magnitude in MAGNITUDES:
+                    points = [steady_state(controller_class, angle,
+                                           magnitude, button_z)
+                              for button_z in BUTTONS]
+                    submode_rows.append([point[0] for point in points])
+                    left_rows.append([point[1] for point in points])
+                    right_rows.append([point[2] for point in points])
+                submodes.append(submode_rows)
+                lefts.append(left_rows)
+                rights.append(right_rows)
+            result[name] = (submodes, lefts, rights)
+        return result
+    finally:
+        clock.use()
+
+
+def rows(result):
+    """the surfaces as rows in SWEEP_FIELDS order"""
+    for name, _ in CONTROLLERS:
+        submodes, lefts, rights = result[name]
+        for i, angle in enumerate(ANGLES):
+            for j, magnitude in enumerate(MAGNITUDES):
+                for k, button_z in enumerate(BUTTONS):
+                    yield (name, angle, magnitude, button_z,
+                           str(submodes[i][j][k]), float(lefts[i][j][k]),
+                           float(rights[i][j][k]))
+
+
+def read_sweep(path):
+    with open(path, 'rb') as sweep:
+        reader = csv.reader(sweep)
+        next(reader)
+        for row in reader:
+            yield (row[0], int(row[1]), int(row[2]), row[3] == 'True',
+                   row[4], float(row[5]), float(row[6]))
+
+
+def diff_sweeps(golden, sweep, tolerance=0.5):
+    """
+    yield (golden row, new row) wherever the submode or either motor speed
+    differs by more than tolerance.  where one sweep runs on past the other,
+    the missing rows are None.
+    """
+    for old, new in itertools.izip_longest(golden, sweep):
+        if old is None or new is None:
+            yield old, new
+        elif old[:5] != new[:5] or abs(old[5] - new[5]) > tolerance or \
+                abs(old[6] - new[6]) > tolerance:
+            yield old, new
+
+
+def main():
+    """sweep the motion controllers, writing or diffing the surfaces"""
+    parser = OptionParser()
+    parser.add_option('-o', '--output', dest='output', default=None,
+                      help="write the sweep to this csv file (default "
+                      "stdout)")
+    parser.add_option('-z', '--npz', dest='npz', default=None,
+                      help="also save the surfaces as numpy arrays in this "
+                      ".npz file, for plotting")
+    parser.add_option('-g', '--golden', dest='golden', default=None,
+                      help="diff the sweep against this saved sweep instead")
+    parser.add_option('-t', '--tolerance', dest='tolerance', type='float',
+                      default=0.5,
+                      help="motor speed differences up to this much are "
+                      "ignored when diffing")
+    parser.add_option('-m', '--max_diffs', dest='max_diffs', type='int',
+                      default=20,
+                      help="show at most this many differing points")
+    parser.add_option('-v', '--verify', dest='verify', action='store_true',
+                      default=False,
+                      help="check the vectorized surfaces against real "
+                      "controller instances at every point")
+    (options, _) = parser.parse_args()
+
+    if numpy is None and (options.npz or options.verify):
+        parser.error("--npz and --verify need numpy")
+
+    if numpy is not None:
+        result = surfaces()
+    else:
+        result = controller_surfaces()
+
+    if options.verify:
+        diffs = 0
+        for old, new in diff_sweeps(rows(controller_surfaces()),
+                                    rows(result), 1e-9):
+            diffs += 1
+            if diffs <= options.max_diffs and old and new:
+                print '%s %3da %3dm z=%-5s controller %-5s %7.1f %7.1f ' \
+                    'vectorized %-5s %7.1f %7.1f' % (
+                        old + new[4:])
+        print '%d points differ' % diffs
+        sys.exit(1 if diffs else 0)
+
+    if options.npz:
+        arrays = {}
+        for name, (submodes, lefts, rights) in result.iteritems():
+            arrays[name + '_submode'] = submodes
+            arrays[name + '_left'] = lefts
+            arrays[name + '_right'] = rights
+        numpy.savez(options.npz, angle=ANGLES, magnitude=MAGNITUDES,
+                    button_z=BUTTONS, **arrays)
+
+    if options.golden:
+        diffs = 0
+        missing = [0, 0]
+        for old, new in diff_sweeps(read_sweep(options.golden),
+                                    rows(result), options.tolerance):
+            diffs += 1
+            if old is None or new is None:
+                missing[old is None] += 1
+                continue
+            if diffs <= options.max_diffs:
+                print '%s %3da %3dm z=%-5s golden %-5s %7.1f %7.1f ' \
+                    'now %-5s %7.1f %7.1f' % (old + new[4:])
+        points = len(CONTROLLERS) * len(ANGLES) * len(MAGNITUDES) * \
+            len(BUTTONS)
+        if missing[0]:
+            print 'the sweep is %d points shorter than the golden sweep' % \
+                missing[0]
+        if missing[1]:
+            print 'the sweep is %d points longer than the golden sweep' % \
+                missing[1]
+        print '%d of %d points differ' % (diffs, points)
+        sys.exit(1 if diffs else 0)
+
+    if options.output:
+        output = open(options.output, 'wb')
+    else:
+        output = sys.stdout
+    writer = csv.writer(output)
+    writer.writerow(SWEEP_FIELDS)
+    for row in rows(result):
+        writer.writerow(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,9 @@
 """get magnitude/angle vectors from a remote wii nunchuck"""
 
+import array
+import collections
 import math
+import threading
 
 import joystick
 
@@ -15,44 +18,48 @@ JOY_MIDDLE = 130
 JOY_BOTTOM = 31
 JOY_DEADZONE = 5
 
-# wireless
-# JOY_LEFT = 0
-# JOY_CENTER = 127
-# JOY_RIGHT = 255
-# JOY_TOP = 255
-# JOY_MIDDLE = 127
-# JOY_BOTTOM = 0
-# JOY_DEADZONE = 10
+Calibration = collections.namedtuple('Calibration', [
+    'left', 'center', 'right', 'top', 'middle', 'bottom', 'deadzone'])
 
+OEM = Calibration(left=JOY_LEFT, center=JOY_CENTER, right=JOY_RIGHT,
+                  top=JOY_TOP, middle=JOY_MIDDLE, bottom=JOY_BOTTOM,
+                  deadzone=JOY_DEADZONE)
+WIRELESS = Calibration(left=0, center=127, right=255, top=255, middle=127,
+                       bottom=0, deadzone=10)
+PROFILES = {'oem': OEM, 'wireless': WIRELESS}
 
-def _scale_joystick_xy(raw_x, raw_y):
+
+def _scale_joystick_xy(raw_x, raw_y, cal=OEM):
     """turn an i2c joystick x/y value into a -100:100 x/y value"""
+    # unpacked once, namedtuple attributes are slow to read
+    left, center, right, top, middle, bottom, deadzone = cal
+
     out_x = 0
-    if raw_x >= JOY_RIGHT:
+    if raw_x >= right:
         out_x = 100
-    elif raw_x <= JOY_LEFT:
+    elif raw_x <= left:
         out_x = -100
-    elif raw_x > JOY_CENTER + JOY_DEADZONE:
-        j_min = JOY_CENTER + JOY_DEADZONE
-        j_max = JOY_RIGHT
+    elif raw_x > center + deadzone:
+        j_min = center + deadzone
+        j_max = right
         out_x = int(100 * (raw_x - j_min) / (j_max - j_min))
-    elif raw_x < JOY_CENTER - JOY_DEADZONE:
-        j_min = JOY_LEFT
-        j_max = JOY_CENTER - JOY_DEADZONE
+    elif raw_x < center - deadzone:
+        j_min = left
+        j_max = center - deadzone
         out_x = int(100 * (raw_x - j_min) / (j_max - j_min)) - 100
 
     out_y = 0
-    if raw_y >= JOY_TOP:
+    if raw_y >= top:
         out_y = 100
-    elif raw_y <= JOY_BOTTOM:
+    elif raw_y <= bottom:
         out_y = -100
-    elif raw_y > JOY_MIDDLE + JOY_DEADZONE:
-        y_min = JOY_MIDDLE + JOY_DEADZONE
-        y_max = JOY_TOP
+    elif raw_y > middle + deadzone:
+        y_min = middle + deadzone
+        y_max = top
         out_y = int(100 * (raw_y - y_min) / (y_max - y_min))
-    elif raw_y < JOY_MIDDLE - JOY_DEADZONE:
-        y_min = JOY_BOTTOM
-        y_max = JOY_MIDDLE - JOY_DEADZONE
+    elif raw_y < middle - deadzone:
+        y_min = bottom
+        y_max = middle - deadzone
         out_y = int(100 * (raw_y - y_min) / (y_max - y_min)) - 100
 
     return out_x, out_y
@@ -87,17 +94,103 @@ def _get_joystick_vector(joy_x, joy_y):
     return magnitude, angle
 
 
-def from_remote_nunchuk(raw_x, raw_y, raw_z, raw_c, recv_time):
-    joy_x, joy_y = _scale_joystick_xy(int(raw_x), int(raw_y))
-    magnitude, angle = _get_joystick_vector(joy_x, joy_y)
-    button_z = False
-    if raw_z == '1':
-        button_z = True
-    button_c = False
-    if raw_c == '1':
-        button_c = True
-    return joystick.Joystick(magnitude=magnitude,
-                             angle=angle,
-                             button_z=button_z,
-                             button_c=button_c,
-                             recv_time=recv_time)
+def _raw_vector(raw_x, raw_y, cal=OEM):
+    """the magnitude, angle for a raw x,y, the long way"""
+    return _get_joystick_vector(*_scale_joystick_xy(raw_x, raw_y, cal))
+
+
+# the raw x,y are bytes, so every magnitude, angle is worked out up front:
+# table[raw_x << 8 | raw_y] is magnitude << 9 | angle
+_ANGLE_BITS = 9
+_ANGLE_MASK = (1 << _ANGLE_BITS) - 1
+
+# compiled tables by calibration, so each is only ever built once.  nothing
+# is built at import, it takes a good fraction of a second on x86 and far
+# longer on the sofa's board
+_TABLES = {}
+# the calibrations whose tables are being built in the background
+_BUILDING = set()
+_BUILDING_LOCK = threading.Lock()
+
+
+def build_table(cal=OEM):
+    """the magnitude, angle of every raw x,y under cal"""
+    table = array.array('H', [0]) * (256 * 256)
+    for raw_x in range(256):
+        for raw_y in range(256):
+            magnitude, angle = _raw_vector(raw_x, raw_y, cal)
+            table[raw_x << 8 | raw_y] = magnitude << _ANGLE_BITS | angle
+    return table
+
+
+def table_for(cal):
+    if cal not in _TABLES:
+        _TABLES[cal] = build_table(cal)
+    return _TABLES[cal]
+
+
+def _build_in_background(cal):
+    with _BUILDING_LOCK:
+        if cal in _BUILDING or cal in _TABLES:
+            return
+        _BUILDING.add(cal)
+    thread = threading.Thread(target=_build, args=(cal,), name='joystick')
+    thread.daemon = True
+    thread.start()
+
+
+def _build(cal):
+    try:
+        table_for(cal)
+    finally:
+        with _BUILDING_LOCK:
+            _BUILDING.discard(cal)
+
+
+def check_table(table=None, cal=OEM):
+    """the (raw_x, raw_y) pairs where table disagrees with the long way"""
+    if table is None:
+        table = table_for(cal)
+    mismatches = []
+    for raw_x in range(256):
+        for raw_y in range(256):
+            packed = table[raw_x << 8 | raw_y]
+            if (packed >> _ANGLE_BITS, packed & _ANGLE_MASK) != \
+                    _raw_vector(raw_x, raw_y, cal):
+                mismatches.append((raw_x, raw_y))
+    return mismatches
+
+
+class Decoder(object):
+    """
+    decodes raw nunchuk readings under one calibration.  the calibration's
+    table is built in the background on first use (unless it's already
+    compiled), and readings are decoded the long way until it's ready.
+    """
+
+    def __init__(self, cal=OEM):
+        self.calibration = cal
+        self._table = None
+
+    def decode(self, raw_x, raw_y, button_z, button_c, recv_time):
+        table = self._table
+        if table is None:
+            table = self._find_table()
+        if table is not None and 0 <= raw_x <= 255 and 0 <= raw_y <= 255:
+            packed = table[raw_x << 8 | raw_y]
+            magnitude, angle = packed >> _ANGLE_BITS, packed & _ANGLE_MASK
+        else:
+            # only legacy text packets can be out of range
+            magnitude, angle = _raw_vector(raw_x, raw_y, self.calibration)
+        return joystick.Joystick._make(
+            (magnitude, angle, button_z, button_c, recv_time))
+
+    def _find_table(self):
+        """the compiled table if there is one, otherwise start building it"""
+        self._table = _TABLES.get(self.calibration)
+        if self._table is None:
+            _build_in_background(self.calibration)
+        return self._table
+
+
+from_remote_nunchuk = Decoder(OEM).decode
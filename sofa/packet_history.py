@@ -1,56 +1,275 @@
 """Packet History"""
 import collections
+import math
+
+import histogram
+
+SEQ_MODULUS = 1 << 32
+
+
+class SequenceTracker(object):
+    """
+    true loss, reordering and duplicate counts from the sequence numbers
+    of the last window packets
+    """
+    # a jump further ahead than this means the remote restarted.  so does
+    # any jump back past the window, a packet that late is never seen
+    RESTART_GAP = 1000
+
+    def __init__(self, window=64):
+        self._window = window
+        self._mask = (1 << window) - 1
+        self.reordered = 0
+        self.duplicates = 0
+        self.max_burst = 0
+        self.reset()
+
+    def reset(self):
+        self._highest = None
+        # bit i is set if packet highest - i has arrived
+        self._seen = 0
+        self._filled = 0
+        self._burst = 0
+
+    @property
+    def active(self):
+        return self._highest is not None
+
+    def loss(self, overdue=0):
+        """
+        the fraction of the window that hasn't arrived (yet), counting the
+        overdue packets that should have followed the highest one so far
+        """
+        expected = min(self._filled + overdue, self._window)
+        if not expected:
+            return 0.0
+        # the overdue packets push the oldest ones out of the window
+        kept = max(expected - overdue, 0)
+        received = bin(self._seen & ((1 << kept) - 1)).count('1')
+        return float(expected - received) / expected
+
+    def add(self, seq):
+        if self._highest is None:
+            self._highest = seq
+            self._seen = 1
+            self._filled = 1
+            return
+
+        # how far ahead of the highest sequence number so far this one is
+        ahead = (seq - self._highest) % SEQ_MODULUS
+        if ahead >= SEQ_MODULUS // 2:
+            ahead -= SEQ_MODULUS
+
+        if ahead > self.RESTART_GAP or ahead <= -self._window:
+            self.reset()
+            self.add(seq)
+        elif ahead > 0:
+            self._advance(ahead)
+            self._highest = seq
+            self._seen |= 1
+        elif ahead > -self._filled:
+            bit = 1 << -ahead
+            if self._seen & bit:
+                self.duplicates += 1
+            else:
+                self._seen |= bit
+                self.reordered += 1
+        else:
+            # from before the first packet seen, too late to place
+            self.reordered += 1
+
+    def _advance(self, count):
+        for _ in range(count):
+            if self._filled == self._window:
+                # the oldest packet leaves the window, settling whether it
+                # was lost for good
+                self._settle(self._seen >> (self._window - 1) & 1)
+            else:
+                self._filled += 1
+            self._seen = (self._seen << 1) & self._mask
+
+    def _settle(self, received):
+        if received:
+            self._burst = 0
+        else:
+            self._burst += 1
+            self.max_burst = max(self.max_burst, self._burst)
+
+
+class LinkPercentiles(object):
+    """
+    p50/p90/p99/max of the receive interval, its jitter (how far each
+    interval is from the nominal one) and the loop's duty cycle, over the
+    last 5 seconds, the last minute and the whole session
+    """
+    WINDOWS = [('5s', 5), ('1m', 60), ('session', None)]
+    METRICS = ['interval', 'jitter', 'duty_cycle']
+    FRACTIONS = [0.50, 0.90, 0.99]
+    # percentiles are recomputed at most this often (seconds)
+    CACHE_TTL = 1.0
+
+    def __init__(self, interval):
+        self._nominal = int(1000000 * interval)
+        self._rolling = []
+        for window, seconds in self.WINDOWS:
+            if seconds:
+                self._rolling.append(
+                    (window, histogram.RollingHistogram(
+                        seconds, metrics=len(self.METRICS))))
+        self._session = [histogram.Histogram() for _ in self.METRICS]
+        self._cached = None
+        self._cached_at = None
+
+    def record(self, now, interval, duty_cycle):
+        """interval in seconds, duty_cycle in percent"""
+        interval = int(1000000 * interval)
+        jitter = abs(interval - self._nominal)
+        duty_cycle = int(duty_cycle)
+        # each value's bucket is worked out once, for every window
+        indexed = [(histogram.bucket_index(interval), interval),
+                   (histogram.bucket_index(jitter), jitter),
+                   (histogram.bucket_index(duty_cycle), duty_cycle)]
+        for _, hist in self._rolling:
+            hist.record_indexes(now, indexed)
+        for hist, (index, value) in zip(self._session, indexed):
+            hist.record_index(index, value)
+
+    def summary(self, now):
+        """
+        {window: {metric: (p50, p90, p99, max)}}, with interval and jitter
+        in ms and duty_cycle in percent
+        """
+        if self._cached is not None and now - self._cached_at < self.CACHE_TTL:
+            return self._cached
+
+        summary = {}
+        for window, hist in self._rolling:
+            summary[window] = self._metrics(
+                [hist.percentiles(now, self.FRACTIONS, metric)
+                 for metric in range(len(self.METRICS))])
+        summary['session'] = self._metrics(
+            [hist.percentiles(self.FRACTIONS) for hist in self._session])
+        self._cached = summary
+        self._cached_at = now
+        return summary
+
+    def _metrics(self, percentiles):
+        interval, jitter, duty_cycle = percentiles
+        return {'interval': tuple([value / 1000.0 for value in interval]),
+                'jitter': tuple([value / 1000.0 for value in jitter]),
+                'duty_cycle': tuple(duty_cycle)}
 
 
 class PacketHistory(collections.deque):
-    _MAX_LENGTH = 50
+    """
+    the timing of the last window receive cycles.  running totals are kept
+    up to date as cycles come and go, so summary costs the same however
+    long the window is.
+    """
+    WINDOW = 50
     _interval = 0
 
-    def __init__(self, interval):
+    def __init__(self, interval, window=WINDOW):
         super(PacketHistory, self).__init__()
         self._interval = interval
+        self._window = window
+        self._sequence = SequenceTracker()
+        self._last_timestamp = None
+        self._last_received = None
+        self._added = 0
+        # (cycle number, cycle_time), with cycle_times decreasing, so the
+        # window's max is always at the front
+        self._cycle_time_max = collections.deque()
+        self._percentiles = LinkPercentiles(interval)
+        self._reset_totals()
+
+    def _reset_totals(self):
+        self._cycle_time_total = 0.0
+        self._interval_total = 0.0
+        self._interval_sq_total = 0.0
+        self._missing_total = 0
+        self._evicted = 0
+        for interval, cycle_time, received_packets in self:
+            self._count(interval, cycle_time, received_packets, 1)
+
+    def _count(self, interval, cycle_time, received_packets, sign):
+        self._cycle_time_total += sign * cycle_time
+        self._interval_total += sign * interval
+        self._interval_sq_total += sign * interval * interval
+        if received_packets == 0:
+            self._missing_total += sign
+
+    def add_sequence(self, seq):
+        """note the sequence number of a received packet"""
+        self._sequence.add(seq)
 
     def add(self, now, cycle_time, received_packets):
-        self.append(tuple((now, cycle_time, received_packets)))
-        while len(self) > self._MAX_LENGTH + 1:
-            self.popleft()
+        last_timestamp, self._last_timestamp = self._last_timestamp, now
+        if received_packets:
+            self._last_received = now
+        if last_timestamp is None:
+            return
+        record = (now - last_timestamp, cycle_time, received_packets)
+        self.append(record)
+        self._count(*record, sign=1)
+        self._percentiles.record(now, record[0],
+                                 100 * cycle_time / self._interval)
+
+        self._added += 1
+        maxes = self._cycle_time_max
+        while maxes and maxes[-1][1] <= cycle_time:
+            maxes.pop()
+        maxes.append((self._added, cycle_time))
+        if maxes[0][0] <= self._added - self._window:
+            maxes.popleft()
+
+        if len(self) > self._window:
+            self._count(*self.popleft(), sign=-1)
+            self._evicted += 1
+            # start over from the records now and then, so rounding errors
+            # in the running totals can't build up
+            if self._evicted >= self._window:
+                self._reset_totals()
+
+    @property
+    def _overdue(self):
+        """packets that should have arrived since the last one, but haven't"""
+        if self._last_received is None:
+            return 0
+        silence = self._last_timestamp - self._last_received
+        # the next packet isn't overdue until a whole interval after it was
+        # due, so ordinary jitter doesn't count as loss
+        return max(int(silence / self._interval) - 1, 0)
+
+    @property
+    def percentiles(self):
+        """LinkPercentiles.summary, as of the latest cycle"""
+        return self._percentiles.summary(self._last_timestamp or 0)
 
     @property
     def summary(self):
-        if len(self) < 2:
-            return 0, 0, 0, 0, 0
-
-        cycle_time_total = 0
-        cycle_time_max = 0
-        jitter_total = 0
-        interval_total = 0
-        missing_total = 0.0
-        extra_total = 0
-        records = len(self) - 1
-
-        record_iter = iter(self)
-        last_timestamp, _, _ = record_iter.next()
-        for [timestamp, cycle_time, received_packets] in record_iter:
-            if cycle_time > cycle_time_max:
-                cycle_time_max = cycle_time
-            cycle_time_total += cycle_time
-            if received_packets == 0:
-                missing_total += 1
-            elif received_packets > 1:
-                extra_total += received_packets - 1
-            interval_total += timestamp - last_timestamp
-            last_timestamp = timestamp
-
-        interval_avg = (interval_total / records)
-
-        record_iter = iter(self)
-        last_timestamp, _, _ = record_iter.next()
-        for [timestamp, cycle_time, received_packets] in record_iter:
-            jitter_total += abs((timestamp - last_timestamp) - interval_avg)
-            last_timestamp = timestamp
-
-        return tuple((int(100 * (cycle_time_total / records) / self._interval),
-                      int(100 * cycle_time_max / self._interval),
-                      int(1000 * interval_total / records),
-                      int(1000 * jitter_total / records),
-                      int(100 * missing_total / records)))
+        records = len(self)
+        if not records:
+            return 0, 0, 0, 0, 0, 0, 0, 0
+
+        cycle_time_avg = self._cycle_time_total / records
+        interval_avg = self._interval_total / records
+        variance = self._interval_sq_total / records - interval_avg ** 2
+        # jitter is the standard deviation of the interval between cycles
+        jitter = math.sqrt(max(variance, 0))
+
+        # sequence numbers tell us what was really lost, otherwise we
+        # have to guess from the cycles where nothing arrived
+        if self._sequence.active:
+            packet_loss = int(100 * self._sequence.loss(self._overdue))
+        else:
+            packet_loss = int(100 * self._missing_total / records)
+
+        return tuple((int(100 * cycle_time_avg / self._interval),
+                      int(100 * self._cycle_time_max[0][1] / self._interval),
+                      int(1000 * interval_avg),
+                      int(1000 * jitter),
+                      packet_loss,
+                      self._sequence.reordered,
+                      self._sequence.duplicates,
+                      self._sequence.max_burst))
@@ -1,17 +1,53 @@
 """get magnitude/angle vectors from a remote wii nunchuck"""
+import array
+import errno
+import fcntl
 import select
 import socket
-import time
+import struct
 
-import nunchuk_joystick
+import clock
+import joystick
 import packet_history
-import remote
+import remote_packet
+import remote_session
 import status
 
 
+# linux's ioctl for the (wall clock) time the last packet read from a socket
+# arrived, as a timeval
+SIOCGSTAMP = 0x8906
+_TIMEVAL = struct.Struct('@ll')
+
+
+class PercentilesStatus(status.Status):
+    _attrs = ['p50', 'p90', 'p99', 'max']
+
+
+class LinkPercentilesStatus(status.Status):
+    """interval and jitter percentiles in ms, duty_cycle in percent"""
+    _attrs = ['interval', 'jitter', 'duty_cycle']
+
+
+def link_percentiles_status(percentiles):
+    """
+    {window: LinkPercentilesStatus} from a PacketHistory's percentiles
+    """
+    statuses = {}
+    for window, metrics in percentiles.iteritems():
+        fields = {}
+        for metric, values in metrics.iteritems():
+            fields[metric] = PercentilesStatus(
+                **dict(zip(PercentilesStatus._attrs, values)))
+        statuses[window] = LinkPercentilesStatus(**fields)
+    return statuses
+
+
 class ReceiverStatus(status.Status):
     _attrs = ['avg_duty_cycle', 'max_duty_cycle', 'interval', 'jitter',
-              'packet_loss', 'remote']
+              'packet_loss', 'reordered', 'duplicates', 'loss_burst',
+              'superseded', 'max_burst', 'percentiles_5s', 'percentiles_1m',
+              'percentiles_session', 'remotes', 'remote']
     _dashboard_fmt = ['{avg_duty_cycle:2d}%', '{max_duty_cycle:2d}%',
                       '{interval:3d}ms', '{jitter:2d}ms', '{packet_loss:3d}%']
 
@@ -22,73 +58,182 @@ class ReceiverStatus(status.Status):
 
 class RemoteControlReceiver(object):
     """a calibrated magnitude/angle from a wii nunchuk"""
-    INTERVAL = 0.1
-    GRACE = 0.1
+    INTERVAL = joystick.REMOTE_INTERVAL
+    GRACE = joystick.TIMEOUT_GRACE
+    MAX_PACKET = 1024
 
     _sock = None
     _last_recv = 0
+    _last_drain = 0
     _cycle_time = 0
-
-    _packet_history = packet_history.PacketHistory(INTERVAL)
-
-    def __init__(self, addr="0.0.0.0", port=31337):
+    _percentiles = None
+    _percentiles_status = None
+
+    def __init__(self, addr="0.0.0.0", port=31337,
+                 history_window=packet_history.PacketHistory.WINDOW,
+                 receive_buffer=None, calibrations=None):
+        # packets are received into _scratch, and swapped with their
+        # session's latest buffer if they look valid, so draining a backlog
+        # never allocates
+        self._scratch = bytearray(self.MAX_PACKET)
+        self._superseded = 0
+        self._max_burst = 0
         self._sock = socket.socket(
             socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
         self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if receive_buffer:
+            # a small buffer makes the kernel drop a stale backlog for us
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                                  receive_buffer)
         self._sock.bind((addr, port))
         self._sock.setblocking(0)
-        self._remote = remote.RemoteControl(None, self._sock)
+        # filled in place by the ioctl (which won't take a bytearray)
+        self._timeval = array.array('B', [0]) * _TIMEVAL.size
+        self.kernel_timestamps = True
+        # the kernel only starts stamping a socket's packets once it's first
+        # asked, so ask now rather than lose the first few
+        try:
+            fcntl.ioctl(self._sock, SIOCGSTAMP, self._timeval, True)
+        except IOError as exc:
+            if exc.errno != errno.ENOENT:
+                self.kernel_timestamps = False
+        self._sessions = remote_session.SessionTable(
+            self._sock, self.INTERVAL, history_window, self.MAX_PACKET,
+            calibrations)
 
     @property
     def remote(self):
-        return self._remote
+        """the remote that's in control"""
+        return self._sessions.controller.remote
+
+    @property
+    def last_packet(self):
+        """the newest RemotePacket from the remote in control, or None"""
+        return self._sessions.controller.packet
+
+    @property
+    def _packet_history(self):
+        return self._sessions.controller.history
+
+    def _link_percentiles(self):
+        percentiles = self._packet_history.percentiles
+        if percentiles is not self._percentiles:
+            # only rebuilt when the history recomputes them
+            self._percentiles = percentiles
+            self._percentiles_status = link_percentiles_status(percentiles)
+        return self._percentiles_status
 
     @property
     def status(self):
-        (avg_duty_cycle, max_duty_cycle, interval,
-         jitter, packet_loss) = self._packet_history.summary
+        percentiles = self._link_percentiles()
+        (avg_duty_cycle, max_duty_cycle, interval, jitter, packet_loss,
+         reordered, duplicates, loss_burst) = self._packet_history.summary
         return ReceiverStatus(avg_duty_cycle=avg_duty_cycle,
                               max_duty_cycle=max_duty_cycle,
                               interval=interval,
                               jitter=jitter,
                               packet_loss=packet_loss,
-                              remote=self._remote.status)
+                              reordered=reordered,
+                              duplicates=duplicates,
+                              loss_burst=loss_burst,
+                              superseded=self._superseded,
+                              max_burst=self._max_burst,
+                              percentiles_5s=percentiles['5s'],
+                              percentiles_1m=percentiles['1m'],
+                              percentiles_session=percentiles['session'],
+                              remotes=len(self._sessions),
+                              remote=self.remote.status)
+
+    def fileno(self):
+        return self._sock.fileno()
 
-    def wait_for_update(self):
-        now = time.time()
-        cycle_time = now - self._last_recv
-        timeout = (self.INTERVAL + (self.INTERVAL * self.GRACE)) - cycle_time
+    @property
+    def timeout(self):
+        """seconds until the next packet is overdue"""
+        timeout = (self.INTERVAL + (self.INTERVAL * self.GRACE)) - \
+            (clock.monotonic() - self._last_recv)
         if timeout < 0:
             timeout = 0
+        return timeout
+
+    def _recv_stamped(self, buf):
+        """
+        (size, sender, arrival time).  the arrival time is when the kernel
+        received the packet, or if it can't say, when we read it
+        """
+        size, sender = self._sock.recvfrom_into(buf)
+        now = clock.monotonic()
+        if self.kernel_timestamps:
+            try:
+                fcntl.ioctl(self._sock, SIOCGSTAMP, self._timeval, True)
+            except IOError as exc:
+                # ENOENT is a packet that arrived before stamping started
+                if exc.errno != errno.ENOENT:
+                    self.kernel_timestamps = False
+                return size, sender, now
+            sec, usec = _TIMEVAL.unpack_from(self._timeval)
+            # a wall clock step between the two can't put it in the future
+            return size, sender, min(clock.from_realtime(sec + usec * 1e-6),
+                                     now)
+        return size, sender, now
 
-        data = None
-        if select.select([self._sock], [], [], timeout):
-            received_packets = 0
-            while True:
-                try:
-                    data, addr = self._sock.recvfrom(1024)
-                    received_packets += 1
-                except socket.error:
-                    break
-
-        now = time.time()
-        self._last_recv = now
-        self._packet_history.add(now, cycle_time, received_packets)
-
-        if data:
-            raw_x, raw_y, raw_z, raw_c, status_age, avg_duty_cycle, max_duty_cycle = data.split(
-                ':')
-            _joystick = nunchuk_joystick.from_remote_nunchuk(
-                raw_x, raw_y, raw_z, raw_c, now)
-            if int(status_age) < 0:
-                updated = 0
-            else:
-                updated = now - float(float(status_age) / 1000)
-            remote_status = remote.RemoteControlStatus(
-                updated=updated,
-                joystick=_joystick,
-                avg_duty_cycle=int(avg_duty_cycle),
-                max_duty_cycle=int(max_duty_cycle))
-
-            self._remote.set_status(remote_status)
-            self._remote.set_addr(addr)
+    def wait_for_update(self):
+        cycle_time = clock.monotonic() - self._last_drain
+        while True:
+            select.select([self._sock], [], [], self.timeout)
+            if self.receive(cycle_time):
+                return
+
+    def receive(self, cycle_time):
+        """
+        drain the socket without blocking and, if the remote in control sent
+        a packet or is overdue, update each remote from its newest packet.
+        cycle_time is how long the last cycle kept us busy.  returns whether
+        there was an update, ie. whether a control cycle is due.
+
+        packets from the other remotes are held until then, so a spare
+        remote can't make the control loop (and its acceleration) run
+        faster.
+        """
+        controller = self._sessions.controller
+        # with nobody in control, any remote might be about to take over
+        anyone = controller.addr is None
+        due = False
+        received_packets = 0
+        while True:
+            try:
+                received, sender, stamp = self._recv_stamped(self._scratch)
+            except socket.error:
+                break
+            received_packets += 1
+            session = self._sessions.session(sender)
+            session.received += 1
+            if session.first_seen is None:
+                session.first_seen = stamp
+            seq = remote_packet.peek_seq(self._scratch, received)
+            if seq is not None:
+                session.history.add_sequence(seq)
+            if remote_packet.looks_valid(self._scratch, received):
+                if session.size:
+                    self._superseded += 1
+                session.latest, self._scratch = self._scratch, session.latest
+                session.size, session.arrival = received, stamp
+                if anyone or session is controller:
+                    due = True
+
+        if received_packets > self._max_burst:
+            self._max_burst = received_packets
+        if not due and self.timeout:
+            return False
+
+        self._last_drain = clock.monotonic()
+
+        # time everything from when the newest packet actually arrived,
+        # not from when we got around to reading it
+        self._sessions.update(self._last_drain, cycle_time)
+        controller = self._sessions.controller
+        if controller.fresh:
+            self._last_recv = controller.last_seen
+        else:
+            self._last_recv = self._last_drain
+        return True
@@ -1,26 +1,47 @@
 """get magnitude/angle vectors from a remote wii nunchuck"""
 
-import time
-
+import clock
 import joystick
 import status
 
 
 class RemoteControlStatus(status.Status):
-    _attrs = ['joystick', 'updated', 'avg_duty_cycle', 'max_duty_cycle']
+    _attrs = ['joystick', 'updated_monotonic', 'avg_duty_cycle',
+              'max_duty_cycle']
     _dashboard_fmt = ['{avg_duty_cycle:3d}%', '{max_duty_cycle:3d}%max']
 
     @property
     def update_age(self):
-        return time.time() - self[1]
+        return clock.monotonic() - self[1]
 
 
 class RemoteControl(object):
+    """
+    a remote, and the status uplink to it.  the remote's display is sent
+    at most UPLINK_RATE times a second, with bursts of up to UPLINK_BURST.
+    a change of mode (brake, turbo, spin...) goes out as soon as there's a
+    token for it and MODE_SPACING has passed since the last send, rather
+    than waiting its turn.  numbers that change in between are coalesced
+    into the next send.
+    """
+    UPLINK_RATE = 2.0
+    UPLINK_BURST = 3.0
+    MODE_SPACING = 0.1
+    # resend even an unchanged display if the remote's copy is this old
+    STALE_AFTER = 1.0
+
     def __init__(self, addr, sock):
         self._addr = addr
         self._sock = sock
         self._last_status_update = 0
-        self._status = RemoteControlStatus(updated=0,
+        self._last_mode = None
+        self._mode_changed = False
+        self._last_send = 0
+        self._tokens = self.UPLINK_BURST
+        self._last_refill = clock.monotonic()
+        self._last_render = 0
+        self.sends = 0
+        self._status = RemoteControlStatus(updated_monotonic=0,
                                            joystick=joystick.new_centered(),
                                            avg_duty_cycle=0,
                                            max_duty_cycle=0)
@@ -43,13 +64,47 @@ class RemoteControl(object):
     def set_status(self, _status):
         self._status = _status
 
-    def update_status(self, status_update):
+    def update_status(self, mode, render):
+        """
+        send render()'s status string to the remote if one is due.  mode is
+        anything comparable that changes whenever the display's mode does;
+        render is only called when a send is due.
+        """
         if not self._addr:
             return
-        if self._status.update_age < 1 and status_update == self._last_status_update:
+
+        now = clock.monotonic()
+        self._tokens = min(self.UPLINK_BURST, self._tokens +
+                           (now - self._last_refill) * self.UPLINK_RATE)
+        self._last_refill = now
+
+        if mode != self._last_mode:
+            self._last_mode = mode
+            self._mode_changed = True
+        if self._tokens < 1:
+            return
+        if self._mode_changed:
+            if now - self._last_send < self.MODE_SPACING:
+                return
+            self._mode_changed = False
+            self._send(render(), now)
+            return
+        if now - self._last_render < 1.0 / self.UPLINK_RATE:
             return
-        self._last_status_update = status_update
 
+        status_update = render()
+        self._last_render = now
+        if self._status.update_age < self.STALE_AFTER and \
+                status_update == self._last_status_update:
+            return
+        self._send(status_update, now)
+
+    def _send(self, status_update, now):
+        self._tokens -= 1
+        self._last_render = now
+        self._last_send = now
+        self._last_status_update = status_update
+        self.sends += 1
         self._sock.sendto(status_update, self._addr)
 
 #    """
@@ -0,0 +1,91 @@
+"""decode (and encode) the joystick packets that the remote sends"""
+import collections
+import struct
+
+# binary packets: magic, version, flags, raw_x, raw_y, avg_duty_cycle,
+# max_duty_cycle, padding, seq, sent_ms, status_age.  all little endian.
+MAGIC = 0xA5
+VERSION = 1
+BINARY = struct.Struct('<BBBBBBBxIIi')
+
+_HEADER = struct.Struct('<BB')
+_SEQ = struct.Struct('<I')
+_SEQ_OFFSET = 8
+
+FLAG_Z = 0x01
+FLAG_C = 0x02
+
+# seq and sent_ms are None for legacy text packets
+RemotePacket = collections.namedtuple('RemotePacket', [
+    'raw_x', 'raw_y', 'button_z', 'button_c', 'status_age',
+    'avg_duty_cycle', 'max_duty_cycle', 'seq', 'sent_ms'])
+
+
+# data can be a str, or a reusable bytearray with only its first size bytes
+# in use, so the receiver doesn't have to copy packets out of its buffer.
+
+
+def _is_binary(data, size):
+    return size == BINARY.size and _HEADER.unpack_from(data)[0] == MAGIC
+
+
+def decode(data, size=None):
+    """
+    parse a binary or legacy text packet into a RemotePacket, or None if
+    it's neither
+    """
+    if size is None:
+        size = len(data)
+    if _is_binary(data, size):
+        (_, version, flags, raw_x, raw_y, avg_duty_cycle, max_duty_cycle,
+         seq, sent_ms, status_age) = BINARY.unpack_from(data)
+        if version != VERSION:
+            return None
+        return RemotePacket(raw_x, raw_y, bool(flags & FLAG_Z),
+                            bool(flags & FLAG_C), status_age, avg_duty_cycle,
+                            max_duty_cycle, seq, sent_ms)
+    return _decode_text(str(data[:size]))
+
+
+def looks_valid(data, size=None):
+    """a cheap check that decode will probably succeed"""
+    if size is None:
+        size = len(data)
+    if _is_binary(data, size):
+        return _HEADER.unpack_from(data)[1] == VERSION
+    return data.count(b':', 0, size) == 6
+
+
+def peek_seq(data, size=None):
+    """the sequence number of a binary packet, without decoding the rest"""
+    if size is None:
+        size = len(data)
+    if _is_binary(data, size):
+        return _SEQ.unpack_from(data, _SEQ_OFFSET)[0]
+    return None
+
+
+def _decode_text(data):
+    # xxx:yyy:z:c:status_age:avg_duty_cycle:max_duty_cycle
+    try:
+        raw_x, raw_y, raw_z, raw_c, status_age, avg_duty_cycle, \
+            max_duty_cycle = data.split(':')
+        return RemotePacket(int(raw_x), int(raw_y), raw_z == '1',
+                            raw_c == '1', int(status_age), int(avg_duty_cycle),
+                            int(max_duty_cycle), None, None)
+    except ValueError:
+        return None
+
+
+def encode(packet):
+    """turn a RemotePacket into a binary packet, the way the remote does"""
+    flags = 0
+    if packet.button_z:
+        flags |= FLAG_Z
+    if packet.button_c:
+        flags |= FLAG_C
+    return BINARY.pack(MAGIC, VERSION, flags, packet.raw_x, packet.raw_y,
+                       min(packet.avg_duty_cycle, 255),
+                       min(packet.max_duty_cycle, 255),
+                       packet.seq & 0xffffffff, packet.sent_ms & 0xffffffff,
+                       packet.status_age)
@@ -0,0 +1,185 @@
+"""
+one session per remote we hear from, and which of them is in control.
+
+the first remote we hear from takes control and keeps it until it goes
+quiet.  another remote can take over by holding Z and C with its stick
+centered for HANDOVER_HOLD seconds, as long as the remote in control isn't
+driving.
+"""
+import nunchuk_joystick
+import packet_history
+import remote
+import remote_packet
+
+
+class RemoteSession(object):
+    """the packets, history and remote control state of one remote"""
+
+    def __init__(self, addr, sock, interval, history_window, max_packet,
+                 decoder=None):
+        self.addr = addr
+        self.decoder = decoder or nunchuk_joystick.Decoder()
+        self.remote = remote.RemoteControl(addr, sock)
+        self.history = packet_history.PacketHistory(interval,
+                                                    window=history_window)
+        # the newest valid packet from this remote, see receiver.receive
+        self.latest = bytearray(max_packet)
+        self.size = 0
+        self.arrival = None
+        self.received = 0
+        # the newest decoded RemotePacket
+        self.packet = None
+        self.first_seen = None
+        self.last_seen = 0
+        # whether a packet arrived in the latest cycle
+        self.fresh = False
+        self.handover_since = None
+
+    def update(self, now, cycle_time):
+        """decode the newest packet received this cycle, if there was one"""
+        self.fresh = self.arrival is not None
+        if self.fresh:
+            now = self.arrival
+            self.last_seen = now
+        self.history.add(now, cycle_time, self.received)
+
+        packet = None
+        if self.size:
+            packet = remote_packet.decode(self.latest, self.size)
+        if packet:
+            self.packet = packet
+            _joystick = self.decoder.decode(
+                packet.raw_x, packet.raw_y, packet.button_z,
+                packet.button_c, now)
+            if packet.status_age < 0:
+                updated = 0
+            else:
+                updated = now - float(float(packet.status_age) / 1000)
+            self.remote.set_status(remote.RemoteControlStatus(
+                updated_monotonic=updated,
+                joystick=_joystick,
+                avg_duty_cycle=packet.avg_duty_cycle,
+                max_duty_cycle=packet.max_duty_cycle))
+
+        self.size = 0
+        self.arrival = None
+        self.received = 0
+
+    def handover_requested(self, now, hold):
+        """whether Z+C has been held with the stick centered for hold secs"""
+        _joystick = self.remote.joystick
+        if not (_joystick.valid and _joystick.button_z and
+                _joystick.button_c and _joystick.centered):
+            self.handover_since = None
+            return False
+        if self.handover_since is None:
+            self.handover_since = now
+        return now - self.handover_since >= hold
+
+
+class SessionTable(object):
+    """remote sessions by source address"""
+    # a remote that's been quiet this long loses control...
+    IDLE_TIMEOUT = 1.0
+    # ...and this long is forgotten altogether
+    EVICT_AFTER = 30.0
+    HANDOVER_HOLD = 1.0
+    # at most this many remotes are tracked at once, however many source
+    # addresses (spoofed or not) packets arrive from
+    MAX_SESSIONS = 8
+
+    def __init__(self, sock, interval, history_window, max_packet,
+                 calibrations=None):
+        self._sock = sock
+        self._calibrations = calibrations
+        self._interval = interval
+        self._history_window = history_window
+        self._max_packet = max_packet
+        self._sessions = {}
+        self._controller = None
+        self._last_eviction = 0
+        # stands in for the controlling remote while there isn't one
+        self._nobody = RemoteSession(None, None, interval, history_window,
+                                     max_packet)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    @property
+    def controller(self):
+        """the session in control, or a centered stand-in"""
+        if self._controller is None:
+            return self._nobody
+        return self._controller
+
+    def session(self, addr):
+        """the session for addr, started if it's new"""
+        session = self._sessions.get(addr)
+        if session is None:
+            if len(self._sessions) >= self.MAX_SESSIONS:
+                self._evict_quietest()
+            decoder = None
+            if self._calibrations:
+                decoder = self._calibrations.decoder(addr)
+            session = RemoteSession(addr, self._sock, self._interval,
+                                    self._history_window, self._max_packet,
+                                    decoder)
+            self._sessions[addr] = session
+        return session
+
+    def update(self, now, cycle_time):
+        """decode this cycle's packets, then decide who's in control"""
+        for session in self._sessions.itervalues():
+            session.update(now, cycle_time)
+        if self._controller is None:
+            self._nobody.update(now, cycle_time)
+
+        self._arbitrate(now)
+
+        if now - self._last_eviction >= 1.0:
+            self._last_eviction = now
+            self._evict(now)
+
+    def _arbitrate(self, now):
+        controller = self._controller
+        if controller is not None and \
+                now - controller.last_seen > self.IDLE_TIMEOUT:
+            controller = None
+
+        if controller is None:
+            # the longest standing of the remotes we're hearing from
+            for session in self._sessions.itervalues():
+                if now - session.last_seen > self.IDLE_TIMEOUT:
+                    continue
+                if controller is None or \
+                        session.first_seen < controller.first_seen:
+                    controller = session
+        else:
+            for session in self._sessions.itervalues():
+                if session is not controller and \
+                        session.handover_requested(now, self.HANDOVER_HOLD) \
+                        and controller.remote.joystick.centered:
+                    controller = session
+                    break
+
+        if controller is not self._controller:
+            if controller is not None:
+                controller.handover_since = None
+            self._controller = controller
+
+    def _evict_quietest(self):
+        """make room by forgetting the quietest remote not in control"""
+        quietest = None
+        for session in self._sessions.itervalues():
+            if session is self._controller:
+                continue
+            if quietest is None or session.last_seen < quietest.last_seen:
+                quietest = session
+        del self._sessions[quietest.addr]
+
+    def _evict(self, now):
+        for addr, session in self._sessions.items():
+            if now - session.last_seen > self.EVICT_AFTER:
+                del self._sessions[addr]
+                if session is self._controller:
+                    self._controller = None
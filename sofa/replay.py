@@ -0,0 +1,212 @@
+#!/usr/bin/python
+"""
+replay recorded joystick packets through the motion controller and the
+acceleration limiter on a virtual clock, as fast as the cpu allows.
+
+the recording is a flight recorder ring file, or a csv exported from one.
+the output is a motor speed trace, which can be saved as a golden trace and
+later diffed against, to see exactly what a change to JOY_MODES,
+ACCEL_PROFILES or the speed caps does to hours of recorded driving.
+"""
+import csv
+import itertools
+import sys
+from optparse import OptionParser
+
+import accel_limit
+import calibration
+import clock
+import flight_recorder
+import joystick
+import motion_complex
+import nunchuk_joystick
+
+TRACE_FIELDS = ['monotonic', 'mode', 'submode', 'target_l', 'target_r',
+                'speed_l', 'speed_r']
+
+
+def _bool(value):
+    if isinstance(value, basestring):
+        return value == 'True'
+    return bool(value)
+
+
+def read_recording(path):
+    """recorded cycles as dicts, from a ring file or a csv export"""
+    with open(path, 'rb') as recording:
+        is_ring = recording.read(len(flight_recorder.MAGIC)) == \
+            flight_recorder.MAGIC
+    if is_ring:
+        for record in flight_recorder.FlightRecorderReader(path):
+            yield record
+        return
+    with open(path, 'rb') as recording:
+        for record in csv.DictReader(recording):
+            yield record
+
+
+def replay(records, update_interval=None, decoder=None):
+    """
+    feed recorded cycles through the sofa's logic, yielding a trace row per
+    cycle in TRACE_FIELDS order.  the joystick is taken as it was decoded
+    at the time, or for older recordings that don't have it, decoded from
+    the raw packet with decoder (a nunchuk_joystick.Decoder, OEM by
+    default).
+    """
+    decoder = decoder or nunchuk_joystick.Decoder()
+    virtual_clock = clock.VirtualClock()
+    clock.use(virtual_clock)
+    try:
+        controller = motion_complex.ComplexMotionController()
+        if update_interval:
+            # as the sofa does with a fixed control rate
+            controller.set_update_interval(update_interval)
+            joystick.use_max_age(joystick.FIXED_RATE_MAX_AGE)
+        limiter = accel_limit.AccelerationLimiter()
+        _joystick = joystick.new_centered()
+        last_seq = None
+        last_ts = None
+        speed_l = speed_r = 0
+
+        for record in records:
+            now = float(record['monotonic'])
+            virtual_clock.set(now)
+            seq = int(record['seq'])
+            # a cycle without a new packet sees the previous joystick, and
+            # lets it age
+            if seq != last_seq or not seq:
+                last_seq = seq
+                button_z = _bool(record['button_z'])
+                button_c = _bool(record['button_c'])
+                if 'magnitude' in record:
+                    _joystick = joystick.Joystick._make(
+                        (int(record['magnitude']), int(record['angle']),
+                         button_z, button_c, now))
+                else:
+                    _joystick = decoder.decode(
+                        int(record['raw_x']), int(record['raw_y']),
+                        button_z, button_c, now)
+
+            controller.update_joystick(_joystick)
+            target_l, target_r = controller.motor_speeds
+            # the monotonic clock starts over across a reboot
+            delay = 0 if last_ts is None else max(now - last_ts, 0)
+            last_ts = now
+            speed_l = limiter.limit(target_l, speed_l, delay)
+            speed_r = limiter.limit(target_r, speed_r, delay)
+
+            yield (now, controller.name, controller.submode,
+                   target_l, target_r, speed_l, speed_r)
+    finally:
+        clock.use()
+        joystick.use_max_age()
+
+
+def read_trace(path):
+    with open(path, 'rb') as trace:
+        reader = csv.reader(trace)
+        next(reader)
+        for row in reader:
+            yield (float(row[0]), row[1], row[2]) + \
+                tuple([float(value) for value in row[3:]])
+
+
+def diff_traces(golden, trace, tolerance=0.5):
+    """
+    yield (golden row, new row) wherever the mode, submode or any motor
+    speed differs by more than tolerance.  where one trace runs on past
+    the other, the missing rows are None.
+    """
+    for old, new in itertools.izip_longest(golden, trace):
+        if old is None or new is None:
+            yield old, new
+            continue
+        if old[1:3] != new[1:3]:
+            yield old, new
+            continue
+        for old_value, new_value in zip(old[3:], new[3:]):
+            if abs(old_value - new_value) > tolerance:
+                yield old, new
+                break
+
+
+def main():
+    """replay a recording, writing or diffing a motor speed trace"""
+    parser = OptionParser(usage="%prog [options] recording")
+    parser.add_option('-o', '--output', dest='output', default=None,
+                      help="write the trace to this csv file (default "
+                      "stdout)")
+    parser.add_option('-g', '--golden', dest='golden', default=None,
+                      help="diff the trace against this golden trace "
+                      "instead")
+    parser.add_option('-t', '--tolerance', dest='tolerance', type='float',
+                      default=0.5,
+                      help="motor speed differences up to this much are "
+                      "ignored when diffing")
+    parser.add_option('-m', '--max_diffs', dest='max_diffs', type='int',
+                      default=20,
+                      help="show at most this many differing cycles")
+    parser.add_option('-u', '--update_interval', dest='update_interval',
+                      type='float', default=None,
+                      help="seconds between controller updates, if the "
+                      "recording wasn't made at the default rate")
+    parser.add_option('-c', '--calibration', dest='calibration',
+                      default=None,
+                      help="nunchuk calibration file, for recordings "
+                      "without the decoded joystick")
+    parser.add_option('-r', '--remote', dest='remote', default=None,
+                      help="the recorded remote's ip address, to pick its "
+                      "calibration")
+    (options, args) = parser.parse_args()
+    if len(args) != 1:
+        parser.error("which recording?")
+
+    decoder = None
+    if options.calibration:
+        decoder = calibration.Calibrations(options.calibration).decoder(
+            (options.remote, None))
+    trace = replay(read_recording(args[0]), options.update_interval,
+                   decoder)
+
+    if options.golden:
+        cycles = [0]
+
+        def counted(rows):
+            for row in rows:
+                cycles[0] += 1
+                yield row
+
+        diffs = 0
+        missing = [0, 0]
+        for old, new in diff_traces(read_trace(options.golden),
+                                    counted(trace), options.tolerance):
+            diffs += 1
+            if old is None or new is None:
+                missing[old is None] += 1
+                continue
+            if diffs <= options.max_diffs:
+                print '%.3f golden %s %s %7.1f %7.1f -> %7.1f %7.1f' % (
+                    old[0], old[1], old[2], old[3], old[4], old[5], old[6])
+                print '%.3f   now  %s %s %7.1f %7.1f -> %7.1f %7.1f' % (
+                    new[0], new[1], new[2], new[3], new[4], new[5], new[6])
+        if missing[0]:
+            print 'the replay is %d cycles shorter than the golden trace' % \
+                missing[0]
+        if missing[1]:
+            print 'the replay is %d cycles longer than the golden trace' % \
+                missing[1]
+        print '%d of %d cycles differ' % (diffs, cycles[0])
+        sys.exit(1 if diffs else 0)
+
+    if options.output:
+        output = open(options.output, 'wb')
+    else:
+        output = sys.stdout
+    writer = csv.writer(output)
+    writer.writerow(TRACE_FIELDS)
+    for row in trace:
+        writer.writerow(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,257 @@
 '''A roboteq RS232 motor controller with accel/deccel enforcement'''
+import errno
+import fcntl
+import heapq
+import os
+import select
+import threading
 import time
 import serial
 
 import accel_limit
+import clock
 import energy_tracker
 import status
 
+# lower numbers are sent to the controller first
+PRIORITY_MOTOR = 0
+PRIORITY_BRAKE = 1
+PRIORITY_TELEMETRY = 2
+
+# the brake is checked ahead of (and separately from) the rest of the
+# telemetry, which is queried together in a single serial round trip
+BRAKE_QUERIES = ['?DI 6']
+TELEMETRY_QUERIES = ['?V', '?BA', '?T']
+
+
+class RoboteqTelemetry(status.Status):
+    _attrs = ['volts', 'amps_l', 'amps_r', 'temps', 'brake', 'timestamp']
+
+
+def _reply_fields(reply):
+    '''strip the "XX=" prefix from a query reply and split its fields'''
+    return reply.split('=', 1)[-1].split(':')
+
+
+def parse_brake(replies):
+    '''turn the replies to BRAKE_QUERIES into the brake state'''
+    return int(_reply_fields(replies[0])[0]) == 1
+
+
+def parse_telemetry(replies, brake, timestamp):
+    '''turn the replies to TELEMETRY_QUERIES into a RoboteqTelemetry'''
+    volts, amps, temps = [_reply_fields(reply) for reply in replies]
+    return RoboteqTelemetry(
+        volts=float(volts[1]) / 10,
+        amps_l=float(amps[1]) / 10,
+        amps_r=float(amps[0]) / 10,
+        temps=[int((float(x) * 1.8) + 32.0) for x in temps],
+        brake=brake,
+        timestamp=timestamp)
+
+
+class SerialCommand(object):
+    '''a batch of serial commands queued on a SerialScheduler'''
+    # the scheduler finishes a command by its deadline, or by the deadline
+    # of the one running ahead of it, so waiting much longer than that
+    # means the worker thread is gone
+    WAIT_GRACE = 1.0
+
+    def __init__(self, cmds, priority, deadline):
+        self.cmds = cmds
+        self.priority = priority
+        self.deadline = deadline
+        self.replies = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def finish(self, replies):
+        self.replies = replies
+        self._done.set()
+
+    def wait(self):
+        '''
+        block until the command has been run, returning its replies, or
+        None if it was skipped or timed out.  raises IOError if the
+        scheduler never answers.
+        '''
+        timeout = self.deadline + self.WAIT_GRACE - clock.monotonic()
+        if not self._done.wait(max(timeout, 0)):
+            raise IOError("the roboteq serial scheduler stopped answering")
+        return self.replies
+
+
+class SerialSchedulerStatus(status.Status):
+    _attrs = ['commands', 'timeouts', 'expired', 'errors', 'preemptions']
+    _dashboard_fmt = ['{timeouts:d}to', '{expired:d}ex', '{errors:d}err',
+                      '{preemptions:d}pre']
+
+
+class SerialScheduler(object):
+    '''
+    runs batches of serial commands one at a time, highest priority first,
+    and gives up on any that can't be answered before their deadline
+    '''
+
+    def __init__(self, port):
+        self._port = port
+        # reads wait in select() for their deadline, so the port itself
+        # never blocks (and never needs reconfiguring)
+        self._port.timeout = 0
+        self._rx_buffer = ''
+        # how many timed out commands might still have a reply on the way
+        self._stale = 0
+        self._queue = []
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._notify_r = None
+        self._notify_w = None
+
+        self._commands = 0
+        self._timeouts = 0
+        self._expired = 0
+        self._errors = 0
+        self._preemptions = 0
+
+        self._worker = threading.Thread(target=self._run,
+                                        name='roboteq-serial')
+        self._worker.daemon = True
+        self._worker.start()
+
+    @property
+    def status(self):
+        return SerialSchedulerStatus(commands=self._commands,
+                                     timeouts=self._timeouts,
+                                     expired=self._expired,
+                                     errors=self._errors,
+                                     preemptions=self._preemptions)
+
+    def submit(self, cmds, priority, timeout):
+        '''queue cmds, to be answered within timeout seconds'''
+        command = SerialCommand(cmds, priority, clock.monotonic() + timeout)
+        with self._cond:
+            self._seq += 1
+            heapq.heappush(self._queue, (priority, self._seq, command))
+            self._cond.notify()
+        return command
+
+    def execute(self, cmds, priority, timeout):
+        '''run cmds, returning their replies or None if they ran late'''
+        return self.submit(cmds, priority, timeout).wait()
+
+    def fileno(self):
+        '''
+        a pipe that becomes readable whenever a command finishes, so the
+        scheduler can be watched from an event loop
+        '''
+        if self._notify_r is None:
+            self._notify_r, self._notify_w = os.pipe()
+            for pipe_fd in (self._notify_r, self._notify_w):
+                fcntl.fcntl(pipe_fd, fcntl.F_SETFL, os.O_NONBLOCK)
+        return self._notify_r
+
+    def clear_notifications(self):
+        try:
+            while os.read(self._notify_r, 1024):
+                pass
+        except OSError as exc:
+            if exc.errno != errno.EAGAIN:
+                raise
+
+    def _finish(self, command, replies):
+        command.finish(replies)
+        if self._notify_w is not None:
+            try:
+                os.write(self._notify_w, 'x')
+            except OSError as exc:
+                # a full pipe is already readable
+                if exc.errno != errno.EAGAIN:
+                    raise
+
+    def _next_command(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            _, seq, command = heapq.heappop(self._queue)
+            # jumping ahead of anything queued earlier is a preemption
+            for _, queued_seq, _ in self._queue:
+                if queued_seq < seq:
+                    self._preemptions += 1
+                    break
+        return command
+
+    def _run(self):
+        while True:
+            command = self._next_command()
+
+            # don't bother asking for an answer nobody is waiting for
+            if clock.monotonic() >= command.deadline:
+                self._expired += 1
+                self._finish(command, None)
+                continue
+
+            try:
+                replies = self._transact(command.cmds, command.deadline)
+            except IOError:
+                self._timeouts += 1
+                self._stale += 1
+                self._resync()
+                self._finish(command, None)
+                continue
+            except ValueError:
+                self._errors += 1
+                # the replies may just be out of step, ours still to come
+                self._stale += 1
+                self._resync()
+                self._finish(command, None)
+                continue
+
+            self._commands += 1
+            self._finish(command, replies)
+
+    def _transact(self, cmds, deadline):
+        self._port.write(''.join([cmd + "\r" for cmd in cmds]))
+
+        # every command is echoed back ahead of its reply
+        lines = self._read_lines(2 * len(cmds), deadline)
+        # after a timeout, late replies to the commands that timed out can
+        # arrive ahead of ours, so skip to our echo
+        while self._stale and lines[0] != cmds[0]:
+            lines = lines[1:] + self._read_lines(1, deadline)
+        if lines[0::2] != cmds:
+            raise ValueError("garbled echo from the roboteq: %r" % lines)
+        self._stale = max(self._stale - 1, 0)
+        return lines[1::2]
+
+    def _read_lines(self, count, deadline):
+        '''read count carriage return terminated lines, using bulk reads'''
+        lines = self._rx_buffer.split("\r")
+        while len(lines) <= count:
+            remaining = deadline - clock.monotonic()
+            if remaining <= 0:
+                raise IOError("timed out waiting for the roboteq")
+            readable, _, _ = select.select([self._port], [], [], remaining)
+            if not readable:
+                raise IOError("timed out waiting for the roboteq")
+            chunk = self._port.read(self._port.in_waiting or 1)
+            self._rx_buffer += chunk
+            lines = self._rx_buffer.split("\r")
+
+        self._rx_buffer = "\r".join(lines[count:])
+        return lines[:count]
+
+    def _resync(self):
+        '''throw away anything left over from a failed command'''
+        self._rx_buffer = ''
+        self._port.reset_input_buffer()
+
 
 class RoboteqStatus(status.Status):
-    _attrs = ['energy', 'brake', 'speed_l', 'speed_r', 'temps']
+    _attrs = ['energy', 'brake', 'speed_l', 'speed_r', 'temps',
+              'telemetry_age', 'serial']
     _dashboard_fmt = ['{energy:20s}', '{0.brake_text:5s}', '{speed_l:4.0f}l',
                       '{speed_r:4.0f}r', '{0.max_temp:3d}F']
 
@@ -34,42 +277,160 @@ class Roboteq(object):
     _energy = energy_tracker.EnergyTracker()
     _accel_limit = accel_limit.AccelerationLimiter()
 
+    # seconds each kind of command may take before it is given up on
+    MOTOR_TIMEOUT = 0.05
+    BRAKE_TIMEOUT = 0.05
+    TELEMETRY_TIMEOUT = 0.05
+
     def __init__(self, path="/dev/ttyACM0", speed=115200):
         if path:
             self._roboteq = serial.Serial(path, speed, timeout=1)
+            self._scheduler = SerialScheduler(self._roboteq)
         else:
             self._roboteq = None
-        self._last_speed_ts = time.time()
+            self._scheduler = None
+        self._brake = False
+        self._telemetry = None
+        self._energy_status = self._energy.status
+        self._poller = None
+        self._pending_telemetry = None
+        self._last_speed_ts = clock.monotonic()
 
-        self._poll_energy()
+        self.poll_telemetry()
 
     @property
     def status(self):
-        self._poll_energy()
+        # with a poller running, the snapshot is already being kept fresh
+        if not self._poller:
+            self.poll_telemetry()
 
         return RoboteqStatus(
             brake=self.brake_active,
-            energy=self._energy.status,
+            energy=self._energy_status,
             temps=self.temps,
             speed_l=self._speed_l,
-            speed_r=self._speed_r)
+            speed_r=self._speed_r,
+            telemetry_age=self.telemetry_age,
+            serial=self.serial_status)
 
-    def _poll_energy(self):
+    @property
+    def serial_status(self):
+        if self._scheduler is None:
+            return SerialSchedulerStatus(commands=0, timeouts=0, expired=0,
+                                         errors=0, preemptions=0)
+        return self._scheduler.status
+
+    @property
+    def telemetry_age(self):
+        '''seconds since the telemetry snapshot was taken'''
+        if self._telemetry is None:
+            return 0
+        return clock.monotonic() - self._telemetry.timestamp
+
+    @property
+    def telemetry(self):
+        '''
+        the most recent telemetry snapshot.  without a poller, polls if
+        there is none; with one running, never blocks on the serial port,
+        and is None until the poller gets its first snapshot.
+        '''
+        if self._telemetry is None and not self._poller:
+            self.poll_telemetry()
+        return self._telemetry
+
+    def poll_telemetry(self):
+        '''
+        query the brake state, then volts, amps and temps in one round trip.
+        late telemetry is dropped, leaving the previous snapshot in place.
+        '''
+        pending = self.request_telemetry()
+        if pending is None:
+            return None
+        for command in pending:
+            command.wait()
+        return self.collect_telemetry()
+
+    def request_telemetry(self):
+        '''
+        queue a telemetry poll without waiting for the replies, returning
+        the pending poll (which may be one that was already queued)
+        '''
         if self._roboteq is None:
+            return None
+        pending = self._pending_telemetry
+        if pending:
+            return pending
+        pending = self._pending_telemetry = (
+            self._scheduler.submit(BRAKE_QUERIES, PRIORITY_BRAKE,
+                                   self.BRAKE_TIMEOUT),
+            self._scheduler.submit(TELEMETRY_QUERIES, PRIORITY_TELEMETRY,
+                                   self.TELEMETRY_TIMEOUT))
+        return pending
+
+    def collect_telemetry(self):
+        '''
+        update the snapshot from a requested poll once all of its replies
+        are in, returning the new snapshot or None
+        '''
+        # read once, the poller thread may collect it from under us
+        pending = self._pending_telemetry
+        if not pending:
+            return None
+        brake, telemetry = pending
+        if not (brake.done and telemetry.done):
+            return None
+        self._pending_telemetry = None
+
+        try:
+            if brake.replies is not None:
+                self._brake = parse_brake(brake.replies)
+            if telemetry.replies is None:
+                return None
+            telemetry = parse_telemetry(telemetry.replies, self._brake,
+                                        clock.monotonic())
+        except (ValueError, IndexError):
+            return None
+
+        self._energy.update(telemetry.volts, telemetry.amps_l,
+                            telemetry.amps_r)
+        self._energy_status = self._energy.status
+        self._telemetry = telemetry
+
+        return telemetry
+
+    def start_poller(self, interval, loop=None):
+        '''
+        keep the telemetry snapshot fresh from a background thread, or from
+        loop (an event_loop.EventLoop) when one is given
+        '''
+        if self._roboteq is None or self._poller:
+            return
+        if loop:
+            loop.add_reader(self._scheduler, self._on_serial_readable)
+            self._poller = loop.call_every(interval, self.request_telemetry)
             return
-        volts = self.roboteq_exec("?V")[2:]
-        amps = self.roboteq_exec("?BA")[3:]
+        self._poller = threading.Thread(target=self._poll_loop,
+                                        args=(interval,),
+                                        name='roboteq-poller')
+        self._poller.daemon = True
+        self._poller.start()
 
-        volts = float(volts.split(':')[1]) / 10
-        amps_l = float(amps.split(':')[1]) / 10
-        amps_r = float(amps.split(':')[0]) / 10
+    def _on_serial_readable(self):
+        self._scheduler.clear_notifications()
+        self.collect_telemetry()
 
-        self._energy.update(volts, amps_l, amps_r)
+    def _poll_loop(self, interval):
+        while True:
+            started = clock.monotonic()
+            self.poll_telemetry()
+            delay = interval - (clock.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
 
     def set_speed(self, speed_l, speed_r):
         '''set the speed of both motors'''
 
-        now = time.time()
+        now = clock.monotonic()
         delay = now - self._last_speed_ts
         self._last_speed_ts = now
 
@@ -79,37 +440,46 @@ class Roboteq(object):
         if self._roboteq is None:
             return
 
-        self.roboteq_exec("!G 1 {}".format(-1 * int(self._speed_l)))
-        self.roboteq_exec("!G 2 {}".format(int(self._speed_r)))
+        self.roboteq_batch(["!G 1 {}".format(-1 * int(self._speed_l)),
+                            "!G 2 {}".format(int(self._speed_r))],
+                           PRIORITY_MOTOR, self.MOTOR_TIMEOUT)
+
+    @property
+    def speeds(self):
+        """the left and right speeds last sent, after acceleration limits"""
+        return self._speed_l, self._speed_r
+
+    @property
+    def energy(self):
+        """the EnergyTrackerStatus as of the latest telemetry"""
+        return self._energy_status
 
     @property
     def brake_active(self):
         '''return true if the emergency brake is active.'''
         if self._roboteq is None:
             return False
-        brake = int(self.roboteq_exec("?DI 6")[3:])
-        return brake == 1
+        return self._brake
 
     @property
     def temps(self):
-        if self._roboteq is None:
+        telemetry = self.telemetry
+        if self._roboteq is None or telemetry is None:
             return 0, 0, 0
-        temps = self.roboteq_exec("?T")[2:]
-        return [int((float(x) * 1.8) + 32.0) for x in temps.split(':')]
+        return telemetry.temps
 
-    def roboteq_exec(self, cmd):
+    def roboteq_exec(self, cmd, priority=PRIORITY_TELEMETRY, timeout=1):
         '''run a single serial command against the controller'''
-        if self._roboteq is None:
+        replies = self.roboteq_batch([cmd], priority, timeout)
+        if replies is None:
+            return None
+        return replies[0]
+
+    def roboteq_batch(self, cmds, priority=PRIORITY_TELEMETRY, timeout=1):
+        '''
+        run several serial commands against the controller at once,
+        returning None if they couldn't be answered within timeout seconds
+        '''
+        if self._scheduler is None:
             return None
-        self._roboteq.write(cmd + "\r")
-        self._roboteq.read(len(cmd) + 1)
-        newline = False
-        resp = ''
-        while not newline:
-            char = self._roboteq.read(1)
-            if char == "\r":
-                newline = True
-            else:
-                resp = resp + char
-
-        return resp
+        return self._scheduler.execute(cmds, priority, timeout)
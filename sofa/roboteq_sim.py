@@ -0,0 +1,205 @@
+#!/usr/bin/python
+'''a simulated roboteq controller on a pseudo-terminal, for offline testing'''
+import os
+import pty
+import random
+import threading
+import time
+import tty
+from optparse import OptionParser
+
+SIM_BRAKE_PIN = 6
+
+
+class RoboteqSimulator(object):
+    '''
+    speaks the subset of the roboteq serial protocol that the sofa uses
+    (!G, ?V, ?BA, ?T and ?DI, with echo) on the slave side of a pty
+    '''
+
+    def __init__(self, baud=115200, latency=0.0, drop_rate=0.0,
+                 garble_rate=0.0, stall_rate=0.0, stall_time=1.0):
+        self.baud = baud
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.garble_rate = garble_rate
+        self.stall_rate = stall_rate
+        self.stall_time = stall_time
+
+        self.volts = 24.0
+        self.temps = [30, 31, 25]
+        self.brake = False
+        self.speeds = [0, 0]
+        self.commands = 0
+
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self._path = os.ttyname(self._slave)
+
+        self._thread = threading.Thread(target=self._run,
+                                        name='roboteq-sim')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def path(self):
+        '''the serial device to hand to roboteq.Roboteq'''
+        return self._path
+
+    def _byte_delay(self, nbytes):
+        # 8 data bits plus start and stop bits
+        if self.baud:
+            time.sleep(nbytes * 10.0 / self.baud)
+
+    def _run(self):
+        pending = ''
+        while True:
+            pending += os.read(self._master, 1024)
+            while "\r" in pending:
+                cmd, pending = pending.split("\r", 1)
+                self._handle(cmd)
+
+    def _handle(self, cmd):
+        self.commands += 1
+        self._byte_delay(len(cmd) + 1)
+
+        if random.random() < self.stall_rate:
+            time.sleep(self.stall_time)
+        if random.random() < self.drop_rate:
+            return
+        if self.latency:
+            time.sleep(self.latency)
+
+        response = cmd + "\r" + self.reply(cmd) + "\r"
+        if random.random() < self.garble_rate:
+            garbled = list(response)
+            garbled[random.randrange(len(garbled))] = chr(
+                random.randrange(32, 127))
+            response = ''.join(garbled)
+
+        self._byte_delay(len(response))
+        os.write(self._master, response)
+
+    @property
+    def amps(self):
+        '''a crude motor load model, amps per motor'''
+        return [abs(speed) * 30.0 / 1000 for speed in self.speeds]
+
+    def reply(self, cmd):
+        '''the controller's reply to a single command, without the echo'''
+        args = cmd.split()
+        if not args:
+            return '-'
+
+        if args[0] == '!G' and len(args) == 3:
+            channel, speed = int(args[1]), int(args[2])
+            if channel not in (1, 2):
+                return '-'
+            self.speeds[channel - 1] = speed
+            return '+'
+        if args[0] == '?V':
+            return 'V=%d:%d:%d' % (120, self.volts * 10, 5000)
+        if args[0] == '?BA':
+            amps_l, amps_r = self.amps
+            return 'BA=%d:%d' % (amps_r * 10, amps_l * 10)
+        if args[0] == '?T':
+            return 'T=' + ':'.join([str(temp) for temp in self.temps])
+        if args[0] == '?DI':
+            inputs = [0] * SIM_BRAKE_PIN
+            inputs[SIM_BRAKE_PIN - 1] = int(self.brake)
+            if len(args) == 2:
+                return 'DI=%d' % inputs[int(args[1]) - 1]
+            return 'DI=' + ':'.join([str(i) for i in inputs])
+
+        return '-'
+
+
+def _rate(count, elapsed):
+    return '{:8.1f}/s {:7.3f}ms avg'.format(count / elapsed,
+                                            1000 * elapsed / count)
+
+
+def benchmark(sim, iterations, listen):
+    '''measure command throughput and control loop latency against sim'''
+    import socket
+
+    import roboteq
+    from sofa import Sofa
+
+    controller = roboteq.Roboteq(path=sim.path)
+
+    start = time.time()
+    for _ in range(iterations):
+        controller.roboteq_exec('?V')
+    print 'roboteq_exec     ', _rate(iterations, time.time() - start)
+
+    start = time.time()
+    for _ in range(iterations):
+        controller.poll_telemetry()
+    print 'poll_telemetry   ', _rate(iterations, time.time() - start)
+
+    start = time.time()
+    for i in range(iterations):
+        controller.set_speed(i % 200, i % 200)
+    print 'set_speed        ', _rate(iterations, time.time() - start)
+
+    print 'serial           ', controller.serial_status
+
+    sofa = Sofa(roboteq_path=sim.path, status_path=None, listen=listen)
+    (addr, port) = listen.split(':')
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    packet = '135:200:0:0:-1:10:10'
+
+    start = time.time()
+    for _ in range(iterations):
+        # a packet is always waiting, so this times everything but the wait
+        sock.sendto(packet, (addr, int(port)))
+        sofa.step()
+    print 'Sofa.step        ', _rate(iterations, time.time() - start)
+
+
+def main():
+    '''run a simulated roboteq, optionally benchmarking against it'''
+    parser = OptionParser()
+
+    parser.add_option('-b', '--baud', dest='baud', type='int',
+                      default=115200,
+                      help="simulated baud rate, 0 for no transfer delay")
+    parser.add_option('--latency', dest='latency', type='float', default=0.0,
+                      help="seconds the controller takes to reply")
+    parser.add_option('--drop', dest='drop_rate', type='float', default=0.0,
+                      help="fraction of commands that get no reply")
+    parser.add_option('--garble', dest='garble_rate', type='float',
+                      default=0.0,
+                      help="fraction of replies with a corrupted byte")
+    parser.add_option('--stall', dest='stall_rate', type='float',
+                      default=0.0,
+                      help="fraction of commands that hang the controller")
+    parser.add_option('--stall_time', dest='stall_time', type='float',
+                      default=1.0,
+                      help="seconds a hung controller stays hung")
+    parser.add_option('--bench', dest='bench', type='int', default=0,
+                      help="run this many iterations of each benchmark")
+    parser.add_option('-l', '--listen', dest='listen',
+                      default="127.0.0.1:31339",
+                      help="ip:port the benchmarked sofa listens on")
+
+    (options, _) = parser.parse_args()
+
+    sim = RoboteqSimulator(baud=options.baud, latency=options.latency,
+                           drop_rate=options.drop_rate,
+                           garble_rate=options.garble_rate,
+                           stall_rate=options.stall_rate,
+                           stall_time=options.stall_time)
+
+    if options.bench:
+        benchmark(sim, options.bench, options.listen)
+        return
+
+    print 'simulated roboteq on', sim.path
+    while True:
+        time.sleep(60)
+
+
+if __name__ == '__main__':
+    main()
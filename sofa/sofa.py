@@ -10,17 +10,26 @@
   motor speeds via the controller, and then passes the motor speeds to the
   roboteq.
 """
-import json
 import time
 
+import calibration
+import clock
+import dashboard
+import event_loop
+import flight_recorder
+import joystick
+import loop_timing
 import motion_complex
 import receiver
 import roboteq
 import status
+import status_segment
+import status_writer
 
 
 class SofaStatus(status.Status):
-    _attrs = ['receiver', 'roboteq', 'controller', 'timestamp', 'runtime']
+    _attrs = ['receiver', 'roboteq', 'controller', 'timestamp', 'runtime',
+              'timing']
     _dashboard_fmt = ['{controller} |',
                       '{0.receiver.remote.joystick.dashboard} |',
                       '{roboteq} |', '{receiver} |',
@@ -32,7 +41,7 @@ class SofaStatus(status.Status):
     _remote_idle_fmt = ['{0.roboteq.energy.watt_hours:3.1f}wh',
                         '{0.roboteq.energy.volts:4.1f}v',
                         '{0.receiver.signal_strength:3d}%~'
-                        '{0.roboteq.min_temp:d-{0.roboteq.max_temp:d}F',
+                        '{0.roboteq.min_temp:d}-{0.roboteq.max_temp:d}F',
                         '{0.roboteq.energy.regen_watt_hours:-6.2f}whr']
     _remote_active_fmt = ['&{0.controller.mode}:{0.controller.submode}'
                           '~{0.controller.throttle_pct:3d}%',
@@ -41,32 +50,81 @@ class SofaStatus(status.Status):
 
 class Sofa(object):
 
-    def __init__(self, roboteq_path, status_path, listen):
-        self._status_path = status_path
+    def __init__(self, roboteq_path, status_path, listen,
+                 telemetry_interval=0, status_interval=0.5,
+                 compact_status=False, status_segment_path=None,
+                 dashboard_interval=0.25, history_window=None,
+                 receive_buffer=None, flight_recorder_path=None,
+                 calibration_path=None):
+        if status_path:
+            self._status_writer = status_writer.StatusWriter(
+                status_path, interval=status_interval, compact=compact_status)
+        else:
+            self._status_writer = None
+        if status_segment_path:
+            self._status_segment = status_segment.StatusSegment(
+                status_segment_path)
+        else:
+            self._status_segment = None
+        if flight_recorder_path:
+            self._flight_recorder = flight_recorder.FlightRecorder(
+                flight_recorder_path)
+        else:
+            self._flight_recorder = None
+        self._dashboard = dashboard.ConsoleDashboard(
+            interval=dashboard_interval)
         (addr, port) = listen.split(':')
+        receiver_args = {}
+        if history_window:
+            receiver_args['history_window'] = history_window
+        if receive_buffer:
+            receiver_args['receive_buffer'] = receive_buffer
+        if calibration_path:
+            receiver_args['calibrations'] = calibration.Calibrations(
+                calibration_path)
         self._receiver = receiver.RemoteControlReceiver(
-            addr=addr, port=int(port))
+            addr=addr, port=int(port), **receiver_args)
         self._roboteq = roboteq.Roboteq(path=roboteq_path)
+        self._telemetry_interval = telemetry_interval
         self._controller = motion_complex.ComplexMotionController()
-        self._start_ts = time.time()
+        self._timing = loop_timing.LoopTiming(
+            receiver.RemoteControlReceiver.INTERVAL)
+        self._start_ts = clock.monotonic()
+
+        self._loop = None
+        self._receive_timeout = None
+        self._control_tick = None
+        self._status_pending = False
+        self._busy_time = 0
 
     @property
     def status(self):
-        now = time.time()
+        now = clock.monotonic()
         return SofaStatus(
             receiver=self._receiver.status,
             roboteq=self._roboteq.status,
             controller=self._controller.status,
-            timestamp=now,
+            timestamp=time.time(),
             runtime=now - self._start_ts,
+            timing=self._timing.status,
         )
 
     def _update_status(self):
         _status = self.status
         self._update_status_file(_status)
         self._receiver.remote.update_status(
-            self._remote_status_string(_status))
-        print _status.dashboard
+            self._remote_mode(_status),
+            lambda: self._remote_status_string(_status))
+        self._dashboard.submit(_status)
+
+    def _remote_mode(self, _status):
+        """
+        the display's mode, see _remote_status_string.  not the submode, or
+        whether the stick is pushed, which steering changes all the time
+        """
+        _joystick = self._receiver.remote.joystick
+        return (self._roboteq.brake_active, _status.controller.mode,
+                _joystick.button_z, _joystick.button_c)
 
     def _remote_status_string(self, _status):
         if self._roboteq.brake_active and self._receiver.remote.joystick.active:
@@ -87,15 +145,122 @@ class Sofa(object):
         return remote_status
 
     def _update_status_file(self, _status):
-        if not self._status_path:
-            return
-        json.dump(_status.as_dict, open(self._status_path, "w"),
-                  sort_keys=True, indent=4, separators=(',', ': '))
+        if self._status_writer:
+            self._status_writer.submit(_status)
+        if self._status_segment:
+            self._status_segment.write(_status)
+
+    def _update_motors(self):
+        timing = self._timing
+        self._controller.update_joystick(self._receiver.remote.joystick)
+        timing.lap('update_joystick')
+        left_motor, right_motor = self._controller.motor_speeds
+        timing.lap('motor_speeds')
+        self._roboteq.set_speed(left_motor, right_motor)
+        timing.lap('set_speed')
+        if self._flight_recorder:
+            self._record_cycle(left_motor, right_motor)
+
+    def _record_cycle(self, left_motor, right_motor):
+        packet = self._receiver.last_packet
+        _joystick = self._receiver.remote.joystick
+        if packet is None:
+            raw_x, raw_y, button_z, button_c, seq = 0, 0, False, False, 0
+        else:
+            raw_x, raw_y = packet.raw_x, packet.raw_y
+            button_z, button_c = packet.button_z, packet.button_c
+            seq = packet.seq or 0
+        speed_l, speed_r = self._roboteq.speeds
+        energy = self._roboteq.energy
+        self._flight_recorder.record(
+            time.time(), clock.monotonic(),
+            raw_x, raw_y, button_z, button_c, seq,
+            _joystick[0], _joystick.angle,
+            self._controller.name, self._controller.submode,
+            left_motor, right_motor,
+            speed_l, speed_r, self._roboteq.brake_active,
+            energy.volts, energy.amps_l, energy.amps_r, energy.watt_hours,
+            energy.regen_watt_hours)
+
+    def step(self):
+        '''run a single cycle of the control loop'''
+        timing = self._timing
+        timing.start_cycle()
+        self._receiver.wait_for_update()
+        timing.lap('wait_for_update')
+        self._update_motors()
+        self._update_status()
+        timing.lap('update_status')
+        timing.end_cycle()
 
     def run(self):
+        if self._telemetry_interval:
+            self._roboteq.start_poller(self._telemetry_interval)
         while True:
-            self._receiver.wait_for_update()
-            self._controller.update_joystick(self._receiver.remote.joystick)
-            left_motor, right_motor = self._controller.motor_speeds
-            self._roboteq.set_speed(left_motor, right_motor)
-            self._update_status()
+            self.step()
+
+    def run_events(self, control_rate=0):
+        '''
+        run the control loop from an event loop instead: each joystick packet
+        is acted on as soon as it arrives, while telemetry and status work is
+        done in the idle time between packets.
+
+        with a control_rate (in Hz), the motion controller and motors are
+        updated at that fixed rate instead, whenever packets arrive.
+        '''
+        self._loop = event_loop.EventLoop()
+        self._loop.add_reader(self._receiver, self._on_receive)
+        interval = (self._telemetry_interval or
+                    receiver.RemoteControlReceiver.INTERVAL)
+        self._roboteq.start_poller(interval, loop=self._loop)
+        self._receive_timeout = self._loop.call_later(self._receiver.timeout,
+                                                      self._on_receive)
+        if control_rate:
+            period = 1.0 / control_rate
+            joystick.use_max_age(joystick.FIXED_RATE_MAX_AGE)
+            self._controller.set_update_interval(period)
+            self._timing = loop_timing.LoopTiming(period)
+            self._control_tick = self._loop.call_every(period, self._on_tick)
+        self._loop.run()
+
+    def _on_receive(self):
+        # called for a new packet, or when one is overdue
+        self._receive_timeout.cancel()
+
+        timing = self._timing
+        if self._control_tick:
+            started = clock.monotonic()
+            self._receiver.receive(self._busy_time)
+            timing.record('wait_for_update', clock.monotonic() - started)
+        else:
+            timing.start_cycle()
+            # only the remote in control (or its timeout) drives a cycle
+            if self._receiver.receive(self._busy_time):
+                timing.lap('wait_for_update')
+                self._update_motors()
+                timing.end_cycle()
+                self._busy_time = clock.monotonic() - timing.cycle_start
+                self._request_status()
+
+        self._receive_timeout = self._loop.call_later(self._receiver.timeout,
+                                                      self._on_receive)
+
+    def _on_tick(self):
+        timing = self._timing
+        timing.start_cycle()
+        self._update_motors()
+        timing.end_cycle()
+        timing.set_skipped(self._control_tick.skipped)
+        self._busy_time = clock.monotonic() - timing.cycle_start
+        self._request_status()
+
+    def _request_status(self):
+        if not self._status_pending:
+            self._status_pending = True
+            self._loop.call_idle(self._on_idle)
+
+    def _on_idle(self):
+        self._status_pending = False
+        started = clock.monotonic()
+        self._update_status()
+        self._timing.record('update_status', clock.monotonic() - started)
@@ -25,9 +25,50 @@ def main():
     parser.add_option('-s', '--status_path', dest="status_path",
                       default="/var/run/sofa_status",
                       help="path to runtime status file")
+    parser.add_option('--status_interval', dest='status_interval',
+                      type='float', default=0.5,
+                      help="seconds between status file updates")
+    parser.add_option('--compact_status', dest='compact_status',
+                      action='store_true', default=False,
+                      help="write the status file without indentation")
+    parser.add_option('--status_segment', dest='status_segment',
+                      default=None,
+                      help="path to a memory mapped status segment for "
+                      "local dashboards, eg. /dev/shm/sofa_status")
+    parser.add_option('-d', '--dashboard_interval', dest='dashboard_interval',
+                      type='float', default=0.25,
+                      help="seconds between console dashboard updates when "
+                      "stdout is a terminal (0 disables it)")
     parser.add_option('-l', '--listen', dest='listen',
                       default="0.0.0.0:31337",
                       help="ip:port to listen on for joystick data")
+    parser.add_option('--history_window', dest='history_window',
+                      type='int', default=None,
+                      help="receive cycles to average the link statistics "
+                      "over (default 50)")
+    parser.add_option('--receive_buffer', dest='receive_buffer',
+                      type='int', default=None,
+                      help="socket receive buffer size in bytes, small "
+                      "enough that a stale backlog can't build up")
+    parser.add_option('-f', '--flight_recorder', dest='flight_recorder',
+                      default=None,
+                      help="path to a ring file that every control cycle is "
+                      "recorded to, eg. /var/run/sofa_flight")
+    parser.add_option('--calibration', dest='calibration', default=None,
+                      help="nunchuk calibration profiles, and which remote "
+                      "uses which (see calibration.py)")
+    parser.add_option('-t', '--telemetry_interval', dest='telemetry_interval',
+                      type='float', default=0,
+                      help="poll roboteq telemetry in the background every "
+                      "this many seconds (0 polls inline every cycle)")
+    parser.add_option('-e', '--event_loop', dest='event_loop',
+                      action='store_true', default=False,
+                      help="handle packets, telemetry and status from an "
+                      "event loop")
+    parser.add_option('-c', '--control_rate', dest='control_rate',
+                      type='float', default=0,
+                      help="with --event_loop, update the motors at this "
+                      "fixed rate (Hz) rather than on every packet")
 
     (options, _) = parser.parse_args()
 
@@ -35,8 +76,20 @@ def main():
 
     sofa = Sofa(roboteq_path=options.roboteq_path,
                 status_path=options.status_path,
-                listen=options.listen)
-    sofa.run()
+                listen=options.listen,
+                telemetry_interval=options.telemetry_interval,
+                status_interval=options.status_interval,
+                compact_status=options.compact_status,
+                status_segment_path=options.status_segment,
+                dashboard_interval=options.dashboard_interval,
+                history_window=options.history_window,
+                receive_buffer=options.receive_buffer,
+                flight_recorder_path=options.flight_recorder,
+                calibration_path=options.calibration)
+    if options.event_loop:
+        sofa.run_events(control_rate=options.control_rate)
+    else:
+        sofa.run()
 
 
 main()
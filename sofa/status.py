@@ -1,7 +1,52 @@
 """a fancy status class"""
+import operator
+import string
+
+_RENDERINGS = ['dashboard', 'remote_parked', 'remote_idle', 'remote_active']
+
+
+class _Field(property):
+    """an accessor for one of a Status's _attrs"""
+
+
+class _StatusMeta(type):
+    """
+    gives every Status class an index based accessor for each of its _attrs,
+    and joins its format lists into format strings once, up front
+    """
+
+    def __init__(cls, name, bases, namespace):
+        super(_StatusMeta, cls).__init__(name, bases, namespace)
+
+        for i, attr in enumerate(cls._attrs):
+            # properties the class defines itself take precedence
+            existing = getattr(cls, attr, None)
+            if existing is None or isinstance(existing, _Field):
+                setattr(cls, attr, _Field(operator.itemgetter(i)))
+
+        cls._formats = {}
+        for rendering in _RENDERINGS:
+            fmt = getattr(cls, '_' + rendering + '_fmt')
+            if fmt:
+                fmt = " ".join(fmt)
+                cls._formats[rendering] = (fmt, _referenced_attrs(cls, fmt))
+
+
+def _referenced_attrs(cls, fmt):
+    """the (attr, index) pairs that fmt refers to by name"""
+    referenced = []
+    for _, field_name, _, _ in string.Formatter().parse(fmt):
+        if field_name is None:
+            continue
+        attr = field_name.split('.')[0].split('[')[0]
+        if attr in cls._attrs:
+            referenced.append((attr, cls._attrs.index(attr)))
+    return referenced
 
 
 class Status(tuple):
+    __metaclass__ = _StatusMeta
+
     _attrs = []
     _dashboard_fmt = []
     _remote_parked_fmt = []
@@ -16,21 +61,26 @@ class Status(tuple):
             args.append(kwargs[attr])
         return super(Status, cls).__new__(cls, args)
 
+    @classmethod
+    def _make(cls, values):
+        """a new instance from values in _attrs order, for hot paths"""
+        return tuple.__new__(cls, values)
+
     @property
     def dashboard(self):
-        return self._render(self._dashboard_fmt, 'dashboard')
+        return self._render('dashboard')
 
     @property
     def remote_parked(self):
-        return self._render(self._remote_parked_fmt, 'remote_parked')
+        return self._render('remote_parked')
 
     @property
     def remote_idle(self):
-        return self._render(self._remote_idle_fmt, 'remote_idle')
+        return self._render('remote_idle')
 
     @property
     def remote_active(self):
-        return self._render(self._remote_active_fmt, 'remote_active')
+        return self._render('remote_active')
 
     def __repr__(self):
         rendered = []
@@ -38,33 +88,26 @@ class Status(tuple):
             rendered.append(str(status))
         return self.__class__.__name__ + '(' + ', '.join(rendered) + ')'
 
-    def _render(self, fmt, preferred_child_attr):
-        if not fmt:
+    def _render(self, rendering):
+        if rendering not in self._formats:
             return str(self)
+        fmt, referenced = self._formats[rendering]
         attrs = {}
-        i = 0
-        for attr in self._attrs:
-            try:
-                attrs[attr] = getattr(self[i], preferred_child_attr)
-            except AttributeError:
-                attrs[attr] = self[i]
-            except TypeError:
-                attrs[attr] = self[i]
-            i += 1
-        args = [self]
+        for attr, i in referenced:
+            # child statuses are rendered the same way as their parent
+            value = self[i]
+            if isinstance(value, Status):
+                value = getattr(value, rendering)
+            attrs[attr] = value
         try:
-            return " ".join(fmt).format(*args, **attrs)
+            return fmt.format(self, **attrs)
         except AttributeError as exc:
             raise RuntimeError(exc)
         except ValueError as exc:
             raise RuntimeError("%s [%s]" % (exc, fmt))
 
     def __getattr__(self, attr):
-        i = 0
-        for defined_attr in self._attrs:
-            if attr == defined_attr:
-                return self[i]
-            i += 1
+        # only reached for attributes that aren't in _attrs
         raise AttributeError("%s not found in %s" % (attr, self))
 
     def __dict__(self):
@@ -72,16 +115,11 @@ class Status(tuple):
 
     @property
     def as_dict(self):
-        i = 0
         status = {}
-        for attr in self._attrs:
-            try:
-                status[attr] = self[i].__dict__()
-            except AttributeError:
-                status[attr] = self[i]
-            except TypeError:
-                status[attr] = self[i]
-            i += 1
+        for attr, value in zip(self._attrs, self):
+            if isinstance(value, Status):
+                value = value.as_dict
+            status[attr] = value
         return status
 
     @property
@@ -0,0 +1,171 @@
+#!/usr/bin/python
+"""
+a fixed layout, memory mapped copy of the sofa's status for local dashboards.
+
+the writer bumps a sequence number to an odd value before it updates the
+segment and back to an even one after, so readers can retry until they get
+a consistent snapshot without any locking (a seqlock).
+"""
+import mmap
+import os
+import struct
+import sys
+import time
+from optparse import OptionParser
+
+import clock
+
+MAGIC = 'SOFA'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sHxxI')
+_SEQ_OFFSET = 8
+
+FIELDS = [
+    ('timestamp', 'd'), ('runtime', 'd'),
+    # receiver
+    ('avg_duty_cycle', 'h'), ('max_duty_cycle', 'h'), ('interval', 'h'),
+    ('jitter', 'h'), ('packet_loss', 'h'),
+    # energy
+    ('volts', 'f'), ('amps_l', 'f'), ('amps_r', 'f'), ('watt_hours', 'f'),
+    ('regen_watt_hours', 'f'),
+    # roboteq
+    ('temp_1', 'h'), ('temp_2', 'h'), ('temp_3', 'h'), ('brake', '?'),
+    ('speed_l', 'f'), ('speed_r', 'f'),
+    # controller
+    ('mode', '8s'), ('submode', '8s'), ('motor_l', 'f'), ('motor_r', 'f'),
+    # joystick
+    ('magnitude', 'h'), ('angle', 'h'), ('button_z', '?'), ('button_c', '?'),
+]
+FIELD_NAMES = [name for name, _ in FIELDS]
+
+_PAYLOAD = struct.Struct('<' + ''.join([fmt for _, fmt in FIELDS]))
+SIZE = _HEADER.size + _PAYLOAD.size
+
+_SEQ = struct.Struct('<I')
+
+
+def _status_fields(_status):
+    """flatten a SofaStatus into FIELDS order"""
+    receiver = _status.receiver
+    roboteq = _status.roboteq
+    energy = roboteq.energy
+    controller = _status.controller
+    joystick = receiver.remote.joystick
+    temp_1, temp_2, temp_3 = (list(roboteq.temps) + [0, 0, 0])[:3]
+    return (_status.timestamp, _status.runtime,
+            receiver.avg_duty_cycle, receiver.max_duty_cycle,
+            receiver.interval, receiver.jitter, receiver.packet_loss,
+            energy.volts, energy.amps_l, energy.amps_r, energy.watt_hours,
+            energy.regen_watt_hours,
+            temp_1, temp_2, temp_3, roboteq.brake,
+            roboteq.speed_l, roboteq.speed_r,
+            controller.mode, controller.submode,
+            controller.motor_l, controller.motor_r,
+            joystick.magnitude, joystick.angle,
+            joystick.button_z, joystick.button_c)
+
+
+class StatusSegment(object):
+    """the writer side, owned by the sofa"""
+
+    def __init__(self, path):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, SIZE)
+            self._map = mmap.mmap(fd, SIZE)
+        finally:
+            os.close(fd)
+        self._seq = 0
+        _HEADER.pack_into(self._map, 0, MAGIC, VERSION, self._seq)
+
+    def write(self, _status):
+        fields = _status_fields(_status)
+        self._seq += 1
+        _SEQ.pack_into(self._map, _SEQ_OFFSET, self._seq & 0xffffffff)
+        _PAYLOAD.pack_into(self._map, _HEADER.size, *fields)
+        self._seq += 1
+        _SEQ.pack_into(self._map, _SEQ_OFFSET, self._seq & 0xffffffff)
+
+
+class StatusSegmentReader(object):
+    """the reader side, for dashboards"""
+    # seconds to wait for a consistent snapshot.  a write takes
+    # microseconds, so a segment that's mid-write for this long belongs to a
+    # writer that died in the middle of one
+    READ_TIMEOUT = 0.1
+
+    def __init__(self, path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self._map = mmap.mmap(fd, SIZE, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        magic, version, _ = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a version %d status segment" %
+                             (path, VERSION))
+
+    @property
+    def seq(self):
+        """changes every time the writer updates the segment"""
+        return _SEQ.unpack_from(self._map, _SEQ_OFFSET)[0]
+
+    def read_fields(self):
+        """
+        a consistent tuple of values, in FIELD_NAMES order.  raises IOError
+        if there isn't one within READ_TIMEOUT.
+        """
+        deadline = None
+        while True:
+            before = self.seq
+            if not before & 1:
+                fields = _PAYLOAD.unpack_from(self._map, _HEADER.size)
+                if self.seq == before:
+                    return fields
+            # mid-write
+            now = clock.monotonic()
+            if deadline is None:
+                deadline = now + self.READ_TIMEOUT
+            elif now > deadline:
+                raise IOError("the status segment has been mid-write for "
+                              "%.1fs, the writer must have died" %
+                              self.READ_TIMEOUT)
+            time.sleep(0)
+
+    def read(self):
+        """a consistent snapshot as a dict"""
+        status = dict(zip(FIELD_NAMES, self.read_fields()))
+        status['mode'] = status['mode'].rstrip('\0')
+        status['submode'] = status['submode'].rstrip('\0')
+        return status
+
+
+def main():
+    """print the sofa's status from the shared segment"""
+    parser = OptionParser()
+    parser.add_option('-p', '--path', dest='path',
+                      default="/dev/shm/sofa_status",
+                      help="path to the status segment")
+    parser.add_option('-w', '--watch', dest='watch', type='float', default=0,
+                      help="keep printing every this many seconds")
+    (options, _) = parser.parse_args()
+
+    reader = StatusSegmentReader(options.path)
+    while True:
+        try:
+            status = reader.read()
+        except IOError as exc:
+            print exc
+            if not options.watch:
+                sys.exit(1)
+        else:
+            print ' '.join(['%s=%s' % (name, status[name])
+                            for name in FIELD_NAMES])
+        if not options.watch:
+            break
+        time.sleep(options.watch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""write the sofa's status to a json file, away from the control loop"""
+import json
+import os
+import sys
+import threading
+import time
+
+import clock
+
+# fields (dotted paths into the status) that change every cycle, or close
+# to it, and so don't count as a change on their own
+VOLATILE_FIELDS = [
+    'timestamp', 'runtime', 'timing',
+    'roboteq.telemetry_age', 'roboteq.serial',
+    'receiver.avg_duty_cycle', 'receiver.max_duty_cycle',
+    'receiver.interval', 'receiver.jitter', 'receiver.percentiles_5s',
+    'receiver.percentiles_1m', 'receiver.percentiles_session',
+    'receiver.remote.updated_monotonic', 'receiver.remote.avg_duty_cycle',
+    'receiver.remote.max_duty_cycle', 'receiver.remote.joystick.recv_time',
+]
+
+
+def _strip(status_dict, paths):
+    """a copy of status_dict without the fields at paths"""
+    stripped = dict(status_dict)
+    nested = {}
+    for path in paths:
+        field, _, rest = path.partition('.')
+        if rest:
+            nested.setdefault(field, []).append(rest)
+        else:
+            stripped.pop(field, None)
+    for field, rest in nested.iteritems():
+        if isinstance(stripped.get(field), dict):
+            stripped[field] = _strip(stripped[field], rest)
+    return stripped
+
+
+class StatusWriter(object):
+    """
+    writes the most recently submitted status at most once per interval,
+    atomically (readers never see a partial file), and only if it changed,
+    or if the file is more than REFRESH seconds old
+    """
+    REFRESH = 5.0
+
+    def __init__(self, path, interval=0.5, compact=False):
+        self._path = path
+        self._tmp_path = path + '.tmp'
+        self._interval = interval
+        self._compact = compact
+        self._latest = None
+        self._last_written = None
+        self._last_write_time = 0
+        self.writes = 0
+        self.skipped = 0
+        self.errors = 0
+
+        self._thread = threading.Thread(target=self._run,
+                                        name='status-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, _status):
+        """hand over a new status, without waiting for it to be written"""
+        self._latest = _status
+
+    def _encode(self, status_dict):
+        if self._compact:
+            return json.dumps(status_dict, sort_keys=True,
+                              separators=(',', ':'))
+        return json.dumps(status_dict, sort_keys=True, indent=4,
+                          separators=(',', ': '))
+
+    def _run(self):
+        while True:
+            time.sleep(self._interval)
+            _status, self._latest = self._latest, None
+            if _status is None:
+                continue
+            try:
+                self.write(_status.as_dict)
+            except Exception as exc:
+                # keep the writer alive, the next status may well write
+                self.errors += 1
+                print >> sys.stderr, "can't write %s: %s" % (self._path, exc)
+
+    def write(self, status_dict):
+        """write status_dict now, unless only its volatile fields changed"""
+        unchanged = _strip(status_dict, VOLATILE_FIELDS)
+        now = clock.monotonic()
+        if unchanged == self._last_written and \
+                now - self._last_write_time < self.REFRESH:
+            self.skipped += 1
+            return
+
+        try:
+            with open(self._tmp_path, 'w') as tmp:
+                tmp.write(self._encode(status_dict))
+            os.rename(self._tmp_path, self._path)
+        except Exception:
+            if os.path.exists(self._tmp_path):
+                os.unlink(self._tmp_path)
+            raise
+        self._last_written = unchanged
+        self._last_write_time = now
+        self.writes += 1
@@ -0,0 +1,122 @@
+"""calibration profiles, and learning one from a remote's packets"""
+import os
+import tempfile
+import time
+import unittest
+
+import calibration
+import nunchuk_joystick
+
+
+class AutoCalibrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.auto = calibration.AutoCalibration()
+        # the stick at rest, centered at 128, 128
+        for _ in range(calibration.AutoCalibration.CENTER_SAMPLES):
+            self.decode(128, 128)
+
+    def decode(self, raw_x, raw_y):
+        return self.auto.decode(raw_x, raw_y, False, False, 0)
+
+    def settle(self, raw_x=128, raw_y=128):
+        for _ in range(calibration.AutoCalibration.SETTLE_PACKETS):
+            self.decode(raw_x, raw_y)
+
+    def test_center(self):
+        self.assertEqual(self.decode(128, 128)[0], 0)
+
+    def test_small_first_push(self):
+        # the oem span around 128 runs right to 223, and the deadzone to
+        # 133: 100 * 3 / 90 is 3, 100 * 7 / 90 is 7 and 100 * 17 / 90 is 18
+        for raw_x, magnitude in ((136, 3), (140, 7), (150, 18)):
+            self.setUp()
+            decoded = self.decode(raw_x, 128)
+            self.assertEqual((decoded[0], decoded.angle), (magnitude, 90))
+
+    def test_pushed_at_startup(self):
+        # a session that turns up with the stick held over never takes that
+        # for the center, and reads as centered until the stick is let go
+        auto = calibration.AutoCalibration()
+        for _ in range(3 * calibration.AutoCalibration.CENTER_SAMPLES):
+            self.assertEqual(auto.decode(200, 128, False, False, 0)[0], 0)
+        for _ in range(calibration.AutoCalibration.CENTER_SAMPLES):
+            self.assertEqual(auto.decode(128, 128, False, False, 0)[0], 0)
+        self.assertEqual(auto.calibration.center, 128)
+        self.assertEqual(auto.decode(200, 128, False, False, 0)[0], 74)
+
+    def test_moving_at_startup(self):
+        # near the center, but not at rest
+        auto = calibration.AutoCalibration()
+        for i in range(calibration.AutoCalibration.CENTER_SAMPLES):
+            auto.decode(120 + 2 * i, 128, False, False, 0)
+        self.assertTrue(auto._extents is None)
+        self.assertEqual(auto.decode(150, 128, False, False, 0)[0], 0)
+
+    def test_widens(self):
+        self.assertEqual(self.decode(250, 128)[0], 100)
+        # 250 is now full right, so 223 no longer is
+        self.assertTrue(self.decode(223, 128)[0] < 100)
+
+    def test_compiles(self):
+        self.settle()
+        self.wait_for_table()
+        cal = self.auto.calibration
+        self.assertEqual(
+            tuple(self.decode(200, 200))[:2],
+            nunchuk_joystick._raw_vector(200, 200, cal))
+
+    def test_compiles_after_a_stale_compile(self):
+        # the stick is pushed further while the first compile is running
+        self.auto._compiling = True
+        self.decode(250, 128)
+        self.settle()
+        self.assertTrue(self.auto._table is None)
+        # the stale compile finishes after the new calibration settled
+        self.auto._compiling = False
+        self.decode(128, 128)
+        self.wait_for_table()
+        self.assertEqual(self.auto.calibration.right, 250)
+
+    def wait_for_table(self):
+        deadline = time.time() + 30
+        while self.auto._table is None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(self.auto._table is not None)
+
+
+PROFILE = """\
+[profile:spare]
+left = %d
+center = 128
+right = 245
+top = 240
+middle = 126
+bottom = 15
+deadzone = 8
+"""
+
+
+class CalibrationsTest(unittest.TestCase):
+
+    def load(self, left):
+        fd, path = tempfile.mkstemp(suffix='.cfg')
+        try:
+            os.write(fd, PROFILE % left)
+            os.close(fd)
+            return calibration.Calibrations(path)
+        finally:
+            os.unlink(path)
+
+    def test_profile(self):
+        self.assertEqual(self.load(10)._profiles['spare'].left, 10)
+
+    def test_zero_range(self):
+        self.assertRaises(calibration.CalibrationError, self.load, 128)
+
+    def test_no_range_outside_the_deadzone(self):
+        self.assertRaises(calibration.CalibrationError, self.load, 120)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""recording cycles to the flight recorder ring, and reading them back"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import flight_recorder
+import remote_packet
+
+
+def _fields(raw_x=135, raw_y=130, seq=1):
+    return (1000.0, 5.0, raw_x, raw_y, False, True, seq, 0, 0,
+            'FWD', 'STRT', 0.0, 0.0, 0.0, 0.0, False,
+            24.0, 0.0, 0.0, 1.0, 0.0)
+
+
+class FlightRecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'flight')
+        self.recorder = flight_recorder.FlightRecorder(self.path, records=4)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read(self):
+        return list(flight_recorder.FlightRecorderReader(self.path))
+
+    def test_round_trip(self):
+        self.recorder.record(*_fields())
+        records = self.read()
+        self.assertEqual(len(records), 1)
+        self.assertEqual((records[0]['raw_x'], records[0]['raw_y'],
+                          records[0]['mode'], records[0]['button_c']),
+                         (135, 130, 'FWD', True))
+
+    def test_wraps(self):
+        for seq in range(6):
+            self.recorder.record(*_fields(seq=seq))
+        self.assertEqual([record['seq'] for record in self.read()],
+                         [2, 3, 4, 5])
+
+    def test_text_packet_out_of_range(self):
+        # text packets aren't limited to a byte
+        for text in ('300:130:0:0:-1:10:10', '-5:-300:0:0:-1:10:10'):
+            packet = remote_packet.decode(text)
+            self.recorder.record(*_fields(packet.raw_x, packet.raw_y))
+        self.assertEqual([(record['raw_x'], record['raw_y'])
+                          for record in self.read()],
+                         [(300, 130), (-5, -300)])
+        self.assertEqual(self.recorder.errors, 0)
+
+    def test_unpackable(self):
+        # dropped and counted, never raised into the control loop
+        self.recorder.record(*_fields(raw_x=1 << 20))
+        self.recorder.record(*_fields(seq=-1))
+        self.recorder.record(*_fields()[:-1])
+        self.recorder.record(*_fields())
+        self.assertEqual(self.recorder.errors, 3)
+        self.assertEqual(len(self.read()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
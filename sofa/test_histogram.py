@@ -0,0 +1,64 @@
+"""log-linear histograms, and rolling windows of them"""
+import random
+import unittest
+
+import histogram
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_buckets(self):
+        for value in range(0, 1 << 20, 7):
+            index = histogram.bucket_index(value)
+            self.assertTrue(histogram.bucket_value(index) >= value)
+            if index:
+                self.assertTrue(histogram.bucket_value(index - 1) < value)
+
+    def test_percentiles(self):
+        hist = histogram.Histogram()
+        for value in range(1, 101):
+            hist.record(value)
+        p50, p90, max_value = hist.percentiles([0.5, 0.9])
+        self.assertTrue(50 <= p50 <= 50 * 17 / 16)
+        self.assertTrue(90 <= p90 <= 90 * 17 / 16)
+        self.assertEqual(max_value, 100)
+
+    def test_empty(self):
+        self.assertEqual(histogram.Histogram().percentiles([0.5, 0.9]),
+                         [0, 0, 0])
+
+
+class RollingHistogramTest(unittest.TestCase):
+
+    def test_matches_a_fresh_histogram(self):
+        # the rolling window agrees with a histogram of just the values in
+        # the last 5 seconds, as slots expire
+        rng = random.Random(15)
+        rolling = histogram.RollingHistogram(5, metrics=2)
+        recorded = []
+        now = 0.0
+        for _ in range(2000):
+            now += rng.choice([0.01, 0.1, 0.1, 0.1, 0.4, 2.5])
+            values = (rng.randint(0, 500000), rng.randint(0, 100))
+            rolling.record(now, *values)
+            recorded.append((now, values))
+            start = int(now) - 4
+            recorded = [(at, at_values) for at, at_values in recorded
+                        if int(at) >= start]
+            for metric in range(2):
+                fresh = histogram.Histogram()
+                for _, at_values in recorded:
+                    fresh.record(at_values[metric])
+                self.assertEqual(
+                    rolling.percentiles(now, [0.5, 0.9, 0.99], metric),
+                    fresh.percentiles([0.5, 0.9, 0.99]))
+
+    def test_goes_quiet(self):
+        rolling = histogram.RollingHistogram(5)
+        rolling.record(0.0, 1000)
+        self.assertEqual(rolling.percentiles(4.5, [0.5]), [1000, 1000])
+        self.assertEqual(rolling.percentiles(100.0, [0.5]), [0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
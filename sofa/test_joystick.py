@@ -0,0 +1,40 @@
+"""when a joystick reading is too old to drive with"""
+import unittest
+
+import clock
+import joystick
+import receiver
+
+
+class MaxAgeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = clock.VirtualClock(100.0)
+        clock.use(self.clock)
+        self.reading = joystick.Joystick._make((80, 0, False, False, 100.0))
+
+    def tearDown(self):
+        clock.use()
+        joystick.use_max_age()
+
+    def magnitude_at(self, age):
+        self.clock.set(100.0 + age)
+        return self.reading.magnitude
+
+    def test_no_later_than_the_receiver_timeout(self):
+        timeout = receiver.RemoteControlReceiver.INTERVAL * \
+            (1 + receiver.RemoteControlReceiver.GRACE)
+        self.assertTrue(joystick.MAX_AGE <= timeout)
+        self.assertEqual(self.magnitude_at(0.1), 80)
+        self.assertEqual(self.magnitude_at(0.12), 0)
+
+    def test_fixed_rate_allows_for_jitter(self):
+        joystick.use_max_age(joystick.FIXED_RATE_MAX_AGE)
+        self.assertEqual(self.magnitude_at(0.14), 80)
+        self.assertEqual(self.magnitude_at(0.16), 0)
+        joystick.use_max_age()
+        self.assertEqual(self.magnitude_at(0.14), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
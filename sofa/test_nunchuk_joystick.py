@@ -0,0 +1,106 @@
+"""decoding raw nunchuk readings, checked against worked out values"""
+import unittest
+
+import nunchuk_joystick
+from nunchuk_joystick import OEM, WIRELESS
+
+# (raw_x, raw_y, magnitude, angle) under the OEM calibration: center 135,130,
+# x from 30 to 230, y from 31 to 231, deadzone 5
+OEM_POINTS = [
+    # centered, and the edges of the deadzone around it
+    (135, 130, 0, 0),
+    (140, 130, 0, 0),
+    (130, 125, 0, 0),
+    # just outside the deadzone: 100 * 1 / (230 - 140) rounds down to 1,
+    # 100 * 99 / (130 - 30) - 100 to -1, 100 * 1 / (231 - 135) to 1 and
+    # 100 * 93 / (125 - 31) - 100 to -2
+    (141, 130, 1, 90),
+    (129, 130, 1, 269),
+    (135, 136, 1, 0),
+    (135, 124, 2, 180),
+    # the extremes.  straight left works out a hair under 270 degrees in
+    # floating point and is truncated to 269
+    (230, 130, 100, 90),
+    (30, 130, 100, 269),
+    (135, 231, 100, 0),
+    (135, 31, 100, 180),
+    # beyond them
+    (255, 130, 100, 90),
+    (0, 130, 100, 269),
+    (135, 255, 100, 0),
+    (135, 0, 100, 180),
+    # the corners, whose magnitude is capped at 100.  PI is 3.14159, so the
+    # angles just short of a whole degree round down
+    (230, 231, 100, 45),
+    (30, 231, 100, 314),
+    (230, 31, 100, 134),
+    (30, 31, 100, 225),
+    # halfway: 100 * 45 / 90 and 100 * 48 / 96
+    (185, 130, 50, 90),
+    (135, 183, 50, 0),
+]
+
+# the wireless calibration: center 127,127, full 0 to 255, deadzone 10
+WIRELESS_POINTS = [
+    (127, 127, 0, 0),
+    (137, 127, 0, 0),
+    (138, 127, 0, 0),
+    (139, 127, 1, 90),
+    (255, 127, 100, 90),
+    (0, 127, 100, 269),
+    (127, 255, 100, 0),
+    (127, 0, 100, 180),
+]
+
+
+class DecoderTest(unittest.TestCase):
+
+    def assert_decodes(self, cal, points):
+        nunchuk_joystick.table_for(cal)
+        decoder = nunchuk_joystick.Decoder(cal)
+        for raw_x, raw_y, magnitude, angle in points:
+            decoded = decoder.decode(raw_x, raw_y, False, False, 0)
+            self.assertEqual((decoded[0], decoded.angle), (magnitude, angle),
+                             "%d,%d" % (raw_x, raw_y))
+        # and that was the table, not the long way
+        self.assertTrue(decoder._table is not None)
+
+    def test_oem(self):
+        self.assert_decodes(OEM, OEM_POINTS)
+
+    def test_wireless(self):
+        self.assert_decodes(WIRELESS, WIRELESS_POINTS)
+
+    def test_table_matches_the_long_way(self):
+        # every raw x,y, for each built in calibration
+        for cal in (OEM, WIRELESS):
+            self.assertEqual(nunchuk_joystick.check_table(cal=cal), [])
+
+    def test_long_way(self):
+        for raw_x, raw_y, magnitude, angle in OEM_POINTS:
+            self.assertEqual(nunchuk_joystick._raw_vector(raw_x, raw_y),
+                             (magnitude, angle))
+
+    def test_out_of_range(self):
+        # legacy text packets aren't limited to a byte
+        decoded = nunchuk_joystick.from_remote_nunchuk(300, 130, True, False,
+                                                       0)
+        self.assertEqual((decoded[0], decoded.angle, decoded.button_z),
+                         (100, 90, True))
+
+    def test_buttons(self):
+        decoded = nunchuk_joystick.from_remote_nunchuk(135, 130, True, True,
+                                                       12.5)
+        self.assertEqual(tuple(decoded), (0, 0, True, True, 12.5))
+
+    def test_lazy(self):
+        cal = OEM._replace(deadzone=7)
+        decoder = nunchuk_joystick.Decoder(cal)
+        self.assertFalse(cal in nunchuk_joystick._TABLES)
+        # decoded the long way while the table builds
+        decoded = decoder.decode(135, 130, False, False, 0)
+        self.assertEqual((decoded[0], decoded.angle), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+"""loss, reordering and restarts from the remote's sequence numbers"""
+import unittest
+
+import packet_history
+
+
+class SequenceTrackerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = packet_history.SequenceTracker()
+
+    def add(self, seqs):
+        for seq in seqs:
+            self.tracker.add(seq)
+
+    def test_in_order(self):
+        self.add(range(200))
+        self.assertEqual((self.tracker.loss(), self.tracker.reordered,
+                          self.tracker.duplicates), (0.0, 0, 0))
+
+    def test_loss(self):
+        self.add([seq for seq in range(200) if seq % 4])
+        self.assertEqual(self.tracker.loss(), 0.25)
+        self.assertEqual(self.tracker.max_burst, 1)
+
+    def test_reordered_and_duplicates(self):
+        self.add([0, 1, 3, 2, 4, 4, 5])
+        self.assertEqual((self.tracker.loss(), self.tracker.reordered,
+                          self.tracker.duplicates), (0.0, 1, 1))
+
+    def test_overdue(self):
+        self.add(range(64))
+        self.assertEqual(self.tracker.loss(overdue=16), 0.25)
+
+    def test_restart_early(self):
+        # a remote that reboots long before its seq reaches RESTART_GAP
+        self.add(range(600))
+        self.add(range(300))
+        self.assertEqual(self.tracker.reordered, 0)
+        self.assertEqual(self.tracker._highest, 299)
+        self.add(seq for seq in range(300, 400) if seq % 2)
+        self.assertEqual(self.tracker.loss(), 0.5)
+
+    def test_restart_far_ahead(self):
+        self.add(range(100))
+        self.add(range(5000, 5100))
+        self.assertEqual((self.tracker.loss(), self.tracker.reordered),
+                         (0.0, 0))
+
+    def test_wraps(self):
+        top = packet_history.SEQ_MODULUS
+        self.add(range(top - 50, top))
+        self.add(range(50))
+        self.assertEqual((self.tracker.loss(), self.tracker.reordered),
+                         (0.0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
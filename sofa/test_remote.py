@@ -0,0 +1,61 @@
+"""the status uplink to the remote, and its budget"""
+import unittest
+
+import clock
+import remote
+
+
+class FakeSocket(object):
+
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr):
+        self.sent.append((clock.monotonic(), data))
+
+
+class UplinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = clock.VirtualClock(100.0)
+        clock.use(self.clock)
+        self.sock = FakeSocket()
+        self.remote = remote.RemoteControl(('127.0.0.1', 4000), self.sock)
+
+    def tearDown(self):
+        clock.use()
+
+    def run_cycles(self, seconds, mode, render, interval=0.1):
+        for i in range(int(round(seconds / interval))):
+            self.clock.set(self.clock.now + interval)
+            self.remote.update_status(mode(i), lambda: render(i))
+
+    def test_mode_change_goes_out_at_once(self):
+        self.run_cycles(2, lambda i: 'IDLE', lambda i: 'idle')
+        sent = len(self.sock.sent)
+        self.clock.set(self.clock.now + 0.1)
+        self.remote.update_status('BRAKE', lambda: 'brake')
+        self.assertEqual(len(self.sock.sent), sent + 1)
+        self.assertEqual(self.sock.sent[-1], (self.clock.now, 'brake'))
+
+    def test_flapping_mode_stays_in_budget(self):
+        seconds = 10
+        self.run_cycles(seconds, lambda i: i % 2, lambda i: str(i))
+        budget = remote.RemoteControl.UPLINK_BURST + \
+            remote.RemoteControl.UPLINK_RATE * seconds
+        self.assertTrue(len(self.sock.sent) <= budget, len(self.sock.sent))
+        times = [sent_at for sent_at, _ in self.sock.sent]
+        for earlier, later in zip(times, times[1:]):
+            self.assertTrue(later - earlier >=
+                            remote.RemoteControl.MODE_SPACING - 1e-9)
+
+    def test_held_mode_change_still_goes_out(self):
+        # a change that arrives while the budget is spent is sent once it
+        # refills, even if the mode doesn't change again
+        self.run_cycles(1, lambda i: i % 2, lambda i: str(i))
+        self.run_cycles(1, lambda i: 'SPIN', lambda i: 'spin')
+        self.assertEqual(self.sock.sent[-1][1], 'spin')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""reading the status segment while the sofa writes it"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import status_segment
+
+
+def _fields(runtime):
+    fields = []
+    for name, fmt in status_segment.FIELDS:
+        if fmt.endswith('s'):
+            fields.append('FWD')
+        elif name == 'runtime':
+            fields.append(runtime)
+        else:
+            fields.append(0)
+    return fields
+
+
+class StatusSegmentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'status')
+        self.segment = status_segment.StatusSegment(self.path)
+        self.reader = status_segment.StatusSegmentReader(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, runtime):
+        # StatusSegment.write, from flattened fields
+        segment = self.segment
+        segment._seq += 1
+        status_segment._SEQ.pack_into(segment._map, status_segment._SEQ_OFFSET,
+                                      segment._seq)
+        status_segment._PAYLOAD.pack_into(segment._map,
+                                          status_segment._HEADER.size,
+                                          *_fields(runtime))
+        segment._seq += 1
+        status_segment._SEQ.pack_into(segment._map, status_segment._SEQ_OFFSET,
+                                      segment._seq)
+
+    def test_read(self):
+        self.write(12.5)
+        status = self.reader.read()
+        self.assertEqual((status['runtime'], status['mode']), (12.5, 'FWD'))
+
+    def test_writer_died_mid_write(self):
+        self.write(12.5)
+        status_segment._SEQ.pack_into(self.segment._map,
+                                      status_segment._SEQ_OFFSET,
+                                      self.segment._seq + 1)
+        started = time.time()
+        self.assertRaises(IOError, self.reader.read)
+        self.assertTrue(time.time() - started <
+                        status_segment.StatusSegmentReader.READ_TIMEOUT + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()